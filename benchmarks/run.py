@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the hot paths of sitegen on a synthetic site
+
+Every measurement runs in a separate process, so the caches of a previous
+step don't affect it, and the peak memory (max RSS) is reported per step.
+"""
+from argparse import ArgumentParser, SUPPRESS
+from contextlib import redirect_stdout
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synth import generate_site
+
+
+def _measure(step: str, root: str, jobs: int) -> dict:
+    from sitegen.app import App
+    from sitegen.siteloader.loader import SiteLoader
+
+    start = time.perf_counter()
+    with open(os.devnull, 'wt') as devnull, redirect_stdout(devnull):
+        if step == 'load':
+            SiteLoader(root).update()
+        else:
+            sys.argv = ['sitegen', 'make', '-r', root, '-j', str(jobs)]
+            App().run()
+    seconds = time.perf_counter() - start
+
+    max_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {'seconds': seconds, 'max_rss_kb': max_rss}
+
+
+def _run_step(step: str, root: str, jobs: int) -> dict:
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', step, root,
+                                      '--jobs', str(jobs)])
+    return json.loads(output.decode())
+
+
+def _change_one_page(root: str):
+    for directory, dirs, files in os.walk(os.path.join(root, 'source')):
+        for entry in sorted(files):
+            if entry.endswith('.md'):
+                with open(os.path.join(directory, entry), 'at') as f:
+                    f.write('\nOne more paragraph.\n')
+                return
+
+
+def run_benchmarks(root: str, info: dict, jobs: int) -> list:
+    results = list()
+
+    def step(name: str, measured: str, items: (int, None)=None, unit: str=''):
+        result = _run_step(measured, root, jobs)
+        result['name'] = name
+        if items is not None:
+            result['throughput'] = '{:.1f} {}'.format(items / result['seconds'], unit)
+        results.append(result)
+
+    step('SiteLoader.update() (cold)', 'load')
+    step('full make', 'make', info['pages'], 'pages/s')
+    results[-1]['copy'] = '{:.1f} MB/s'.format(info['asset_bytes'] / results[-1]['seconds'] / 2 ** 20)
+    step('SiteLoader.update() (snapshot)', 'load')
+    step('no-op make', 'make')
+    _change_one_page(root)
+    step('single page change make', 'make')
+
+    return results
+
+
+def _print_results(info: dict, results: list):
+    print('Site: {pages} pages, {assets} assets ({mb:.1f} MB)'.format(mb=info['asset_bytes'] / 2 ** 20, **info))
+    for result in results:
+        extra = ', '.join(result[key] for key in ('throughput', 'copy') if key in result)
+        print('  {:<32} {:>9.3f} s  {:>8.1f} MB max RSS  {}'.format(result['name'], result['seconds'],
+                                                                   result['max_rss_kb'] / 1024, extra))
+
+
+def main():
+    parser = ArgumentParser(description='Run sitegen benchmarks on a synthetic site')
+    parser.add_argument('--pages', type=int, default=1000, help='Number of Markdown pages')
+    parser.add_argument('--html-pages', type=int, default=100, help='Number of HTML pages')
+    parser.add_argument('--assets', type=int, default=100, help='Number of assets')
+    parser.add_argument('--asset-size', type=int, default=64 * 1024, help='Size of an asset in bytes')
+    parser.add_argument('--depth', type=int, default=2, help='Maximum depth of the directories')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel jobs of make')
+    parser.add_argument('--directory', type=str, help='Generate the site here and keep it')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--child', nargs=2, metavar=('STEP', 'ROOT'), help=SUPPRESS)
+    ns = parser.parse_args()
+
+    if ns.child:
+        print(json.dumps(_measure(ns.child[0], ns.child[1], ns.jobs)))
+        return
+
+    root = ns.directory or tempfile.mkdtemp(prefix='sitegen-bench-')
+    try:
+        info = generate_site(root, pages=ns.pages, html_pages=ns.html_pages, assets=ns.assets,
+                             asset_size=ns.asset_size, depth=ns.depth)
+        results = run_benchmarks(root, info, ns.jobs)
+    finally:
+        if not ns.directory:
+            shutil.rmtree(root)
+
+    if ns.json:
+        print(json.dumps({'site': info, 'results': results}, indent=2))
+    else:
+        _print_results(info, results)
+
+
+if __name__ == '__main__':
+    main()
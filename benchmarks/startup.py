@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measures the startup time of the sitegen commands
+
+Every command is started with --help several times in a new interpreter, with
+'python -X importtime', so both the wall time and the time spent importing
+modules are reported, together with the slowest modules imported directly.
+"""
+from argparse import ArgumentParser
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SITEGEN = os.path.join(ROOT_DIR, 'sitegen.py')
+
+sys.path.insert(0, ROOT_DIR)
+
+from sitegen.command import COMMANDS
+
+
+def _parse_importtime(output: str) -> list:
+    """
+    Returns the (module, cumulative microseconds) pairs of the top level imports
+    """
+    imports = list()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        if name.startswith(' ') and not name.startswith('  '):
+            imports.append((name.strip(), int(fields[1])))
+    return imports
+
+
+def _measure(command: (str, None)) -> dict:
+    args = [sys.executable, '-X', 'importtime', SITEGEN] + ([command] if command else []) + ['--help']
+    start = time.perf_counter()
+    process = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    seconds = time.perf_counter() - start
+
+    imports = _parse_importtime(process.stderr.decode())
+    return {
+        'seconds': seconds,
+        'import_seconds': sum(us for name, us in imports) / 1e6,
+        'slowest_imports': [[name, us / 1e6] for name, us in sorted(imports, key=lambda i: i[1], reverse=True)[:3]],
+    }
+
+
+def run_benchmarks(runs: int) -> list:
+    results = list()
+    for command in [None] + list(COMMANDS):
+        # the fastest run is kept, as the others are slowed down by the rest of the system
+        result = min((_measure(command) for _ in range(runs)), key=lambda r: r['seconds'])
+        result['name'] = command or '(no command)'
+        results.append(result)
+    return results
+
+
+def _print_results(results: list):
+    print('Startup time of "sitegen.py COMMAND --help" (wall / imports):')
+    for result in results:
+        slowest = ', '.join('{} {:.1f} ms'.format(name, seconds * 1000)
+                            for name, seconds in result['slowest_imports'])
+        print('  {:<14} {:>7.1f} ms {:>7.1f} ms  {}'.format(result['name'], result['seconds'] * 1000,
+                                                           result['import_seconds'] * 1000, slowest))
+
+
+def main():
+    parser = ArgumentParser(description='Measure the startup time of the sitegen commands')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs per command, the fastest is reported')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    ns = parser.parse_args()
+
+    results = run_benchmarks(ns.runs)
+    if ns.json:
+        print(json.dumps({'results': results}, indent=2))
+    else:
+        _print_results(results)
+
+
+if __name__ == '__main__':
+    main()
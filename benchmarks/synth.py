@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Generates a synthetic site for benchmarking
+"""
+from argparse import ArgumentParser
+import os
+import random
+
+TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<title>(( page.title )) - (( site.name ))</title>
+<link rel="stylesheet" href="(( site.root_dir ))/theme/css/style.css">
+</head>
+<body>
+{% if page.tags %}<ul>{% for tag in page.tags %}<li>(( tag ))</li>{% endfor %}</ul>{% endif %}
+(( content ))
+</body>
+</html>
+"""
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi').split()
+
+
+def _sentence(rnd: random.Random, count: int) -> str:
+    return ' '.join(rnd.choice(WORDS) for _ in range(count))
+
+
+def _sub_directory(rnd: random.Random, depth: int) -> str:
+    return os.sep.join('d{}'.format(rnd.randrange(8)) for _ in range(rnd.randrange(depth + 1)))
+
+
+def _write(path: str, contents, mode: str='wt') -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(contents)
+
+
+def _markdown_page(rnd: random.Random, index: int, paragraphs: int) -> str:
+    lines = [
+        '--',
+        'title: Page {}'.format(index),
+        'tags: [{}]'.format(', '.join(rnd.sample(WORDS, 3))),
+        '--',
+        '',
+        '# {}'.format(_sentence(rnd, 4).capitalize()),
+        '',
+    ]
+    for i in range(paragraphs):
+        lines.append(_sentence(rnd, 60) + '.')
+        lines.append('')
+        if i % 3 == 2:
+            lines.extend('* ' + _sentence(rnd, 6) for _ in range(4))
+            lines.append('')
+    return '\n'.join(lines)
+
+
+def _html_page(rnd: random.Random, paragraphs: int) -> str:
+    return '\n'.join('<p>{}.</p>'.format(_sentence(rnd, 60)) for _ in range(paragraphs))
+
+
+def generate_site(root: str, *, pages: int=1000, html_pages: int=100, assets: int=100, asset_size: int=64 * 1024,
+                  depth: int=2, paragraphs: int=10, seed: int=0) -> dict:
+    """
+    Creates a site with Markdown and HTML pages in nested directories, assets and a theme
+
+    Returns the number of generated files and bytes.
+    """
+    rnd = random.Random(seed)
+
+    _write(os.path.join(root, '_config.yml'), 'name: Benchmark\n')
+    _write(os.path.join(root, 'templates', 'current', 'default.tpl'), TEMPLATE)
+    _write(os.path.join(root, 'templates', 'current', 'assets', 'css', 'style.css'), 'body { margin: 0; }\n')
+
+    for i in range(pages):
+        path = os.path.join(root, 'source', _sub_directory(rnd, depth), 'page{}.md'.format(i))
+        _write(path, _markdown_page(rnd, i, paragraphs))
+
+    for i in range(html_pages):
+        path = os.path.join(root, 'source', _sub_directory(rnd, depth), 'html{}.html'.format(i))
+        _write(path, _html_page(rnd, paragraphs))
+
+    asset_bytes = 0
+    for i in range(assets):
+        path = os.path.join(root, 'images', _sub_directory(rnd, depth), 'image{}.bin'.format(i))
+        _write(path, os.urandom(asset_size), 'wb')
+        asset_bytes += asset_size
+
+    return {'pages': pages + html_pages, 'assets': assets, 'asset_bytes': asset_bytes}
+
+
+def main():
+    parser = ArgumentParser(description='Generate a synthetic site')
+    parser.add_argument('directory', help='Target directory')
+    parser.add_argument('--pages', type=int, default=1000, help='Number of Markdown pages')
+    parser.add_argument('--html-pages', type=int, default=100, help='Number of HTML pages')
+    parser.add_argument('--assets', type=int, default=100, help='Number of assets')
+    parser.add_argument('--asset-size', type=int, default=64 * 1024, help='Size of an asset in bytes')
+    parser.add_argument('--depth', type=int, default=2, help='Maximum depth of the directories')
+    parser.add_argument('--paragraphs', type=int, default=10, help='Number of paragraphs per page')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    ns = parser.parse_args()
+
+    print(generate_site(ns.directory, pages=ns.pages, html_pages=ns.html_pages, assets=ns.assets,
+                        asset_size=ns.asset_size, depth=ns.depth, paragraphs=ns.paragraphs, seed=ns.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
-#!/usr/bin/env python3.4
+#!/usr/bin/env python3
+
+import sys
 
 from sitegen.app import App
 
-App().run()
+sys.exit(App().run())
@@ -1,31 +1,43 @@
 from argparse import ArgumentParser
+import importlib
 import sys
 
-from .command.init import Init
-from sitegen.command.deps import Deps
-from sitegen.command.make import Make
+from sitegen.command import COMMANDS
 
 
 class App:
 
-    def run(self):
-        parser = self.__init_parsers()
-        self.__parse(parser)
-
-    def __init_parsers(self):
+    def run(self) -> int:
+        """
+        Runs the command given on the command line, returns its exit status
+        """
+        parser = self.__init_parsers(self.__get_command_name(sys.argv[1:]))
+        return self.__parse(parser)
+
+    @staticmethod
+    def __get_command_name(args) -> (str, None):
+        for arg in args:
+            if not arg.startswith('-'):
+                return arg if arg in COMMANDS else None
+        return None
+
+    def __init_parsers(self, command_name: (str, None)):
         parser = ArgumentParser(description='Site Generator')
 
         subparsers = parser.add_subparsers(dest='_subcmd', title='Commands')
 
-        Init.create(subparsers)
-        Deps.create(subparsers)
-        Make.create(subparsers)
+        for name, (module_name, class_name, help) in COMMANDS.items():
+            if name == command_name:
+                getattr(importlib.import_module(module_name), class_name).create(subparsers)
+            else:
+                subparsers.add_parser(name, help=help)
 
         return parser
 
-    def __parse(self, parser):
+    def __parse(self, parser) -> int:
         ns = parser.parse_args(sys.argv[1:])
         if ns._subcmd:
-            ns._cmd.perform(ns)
+            return ns._cmd.perform(ns)
         else:
             parser.print_help()
+            return 0
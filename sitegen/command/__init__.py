@@ -0,0 +1,13 @@
+from collections import OrderedDict
+
+# The commands by name: module, class and help. The module of a command is imported only
+# if the command is run (or its help is printed), so the startup doesn't pay for the others.
+COMMANDS = OrderedDict([
+    ('init', ('sitegen.command.init', 'Init', 'Initialize an empty Site')),
+    ('build', ('sitegen.command.build', 'Build', 'Build the site or the given targets')),
+    ('deps', ('sitegen.command.deps', 'Deps', 'Print the dependencies and the actions of the targets')),
+    ('make', ('sitegen.command.make', 'Make', 'Make (generate) site')),
+    ('serve', ('sitegen.command.serve', 'Serve',
+               'Serve the site locally, building the requested pages on demand')),
+    ('watch', ('sitegen.command.watch', 'Watch', 'Watch the site and rebuild it on changes')),
+])
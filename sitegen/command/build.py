@@ -0,0 +1,115 @@
+import os
+import shutil
+
+from sitegen.command.make import Make
+from sitegen.siteloader.assets import CopyAction
+from sitegen.siteloader.loader import SiteLoader
+from sitegen.siteloader.theme import INSTALL_DIRECTORY as THEME_INSTALL_DIRECTORY
+
+OUTPUT_DIRECTORIES = ('_install', '_build')
+
+
+class Build(Make):
+    """
+    Builds the site or parts of it with the dependency graph of sitegen
+
+    The targets are:
+      all     the whole site, then the stale files of _install and _build are removed (default)
+      assets  the files copied from the asset directories
+      theme   the files copied from templates/current/assets
+      prune   only removes the stale files of _install and _build
+      clean   removes _install and _build, before building the other targets
+    or a target (e.g. _install/about.html, or about.html within _install) or a source file
+    (e.g. source/about.md), which builds all targets generated from it.
+    """
+
+    def _register_arguments(self, parser):
+        super()._register_arguments(parser)
+        parser.add_argument('targets', nargs='*', default=['all'], metavar='TARGET',
+                            help='all (default), assets, theme, prune, clean, a target or a source file')
+        parser.add_argument('-n', '--dry-run', action='store_true',
+                            help='Print the targets which would be built or removed, without changing anything')
+        parser.add_argument('-k', '--keep-going', action='store_true',
+                            help='Build the targets not depending on a failed one instead of stopping')
+
+    def _make(self) -> int:
+        targets = list(self._ns.targets)
+        if 'clean' in targets:
+            targets = [target for target in targets if target != 'clean']
+            self.__clean()
+            if not targets:
+                return 0
+
+        loader = SiteLoader(self._ns.root[0], keep_intermediates=self._ns.keep_intermediates)
+        loader.update()
+
+        graph = loader.dependency_collector.graph
+        keys = self.__resolve_targets(graph, targets)
+        builder = self._create_builder(graph.dependencies, loader.site_config, loader.build_state,
+                                       keep_going=self._ns.keep_going)
+        try:
+            if self._ns.dry_run:
+                for target in builder.get_outdated(keys):
+                    print("Would build", target)
+                result = 0
+            else:
+                result = builder.build(keys) if keys else 0
+
+            if 'all' in targets or 'prune' in targets:
+                for directory in OUTPUT_DIRECTORIES:
+                    builder.remove_orphans(directory, dry_run=self._ns.dry_run)
+
+            self._write_changed_list()
+
+            return result
+        finally:
+            if not self._ns.dry_run:
+                loader.build_state.save()
+
+    def __clean(self):
+        for directory in OUTPUT_DIRECTORIES:
+            path = os.path.join(self._ns.root[0], directory)
+            if not os.path.exists(path):
+                continue
+            if self._ns.dry_run:
+                print("Would remove", directory)
+                continue
+            print("Removing", directory)
+            shutil.rmtree(path)
+
+    def __resolve_targets(self, graph, targets) -> list:
+        keys = list()
+        for target in targets:
+            if target == 'all':
+                keys.append('__site__')
+            elif target == 'prune':
+                continue
+            elif target == 'assets':
+                keys.extend(self.__get_copied_files(graph, theme=False))
+            elif target == 'theme':
+                keys.extend(self.__get_copied_files(graph, theme=True))
+            elif graph.has(target):
+                keys.append(target)
+            elif graph.has(os.path.join('_install', target)):
+                keys.append(os.path.join('_install', target))
+            elif graph.has_dependents(target):
+                keys.extend(self.__get_generated_targets(graph, target))
+            else:
+                raise Exception("Unknown target; target='{}'".format(target))
+        return keys
+
+    @staticmethod
+    def __get_copied_files(graph, *, theme: bool) -> list:
+        return [name for name, entry in graph.dependencies.items()
+                if entry.action is CopyAction and name.startswith(THEME_INSTALL_DIRECTORY + os.sep) == theme]
+
+    @staticmethod
+    def __get_generated_targets(graph, path: str) -> list:
+        targets = list()
+        pending = [path]
+        while pending:
+            for dependent in graph.dependents(pending.pop()):
+                if dependent not in targets and not graph.get_entry(dependent).phony:
+                    targets.append(dependent)
+                    pending.append(dependent)
+        return targets
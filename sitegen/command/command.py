@@ -1,5 +1,7 @@
 from argparse import Namespace
 
+from sitegen.command import COMMANDS
+
 
 class SimpleCommand:
     def __init__(self):
@@ -33,7 +35,9 @@ class Command(SimpleCommand):
         parser.set_defaults(_cmd=self)
 
     def _get_command_help(self) -> str:
-        return ''
+        # the help is in COMMANDS only, as it is shown without importing the command
+        name = self.__class__.__name__.lower()
+        return COMMANDS[name][2] if name in COMMANDS else ''
 
     def _get_command_description(self) -> str:
         return ''
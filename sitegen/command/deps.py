@@ -3,23 +3,24 @@ from sitegen.siteloader.loader import SiteLoader
 
 
 class Deps(Command):
-    def _get_command_help(self) -> str:
-        return 'Create HTML text from markdown files'
-
     def _register_arguments(self, parser):
         parser.add_argument('-r', '--root', nargs=1, type=str, required=True,
                             help='Site Root')
+        parser.add_argument('--keep-intermediates', action='store_true',
+                            help='Write the compiled pages and their front matter into _build (for debugging)')
 
     def _perform(self) -> int:
-        loader = SiteLoader(self._ns.root[0])
+        loader = SiteLoader(self._ns.root[0], keep_intermediates=self._ns.keep_intermediates)
         loader.update()
 
         print('\nDependencies:')
-        for d, v in loader.dependency_collector.dependencies.items():
-            print('  ', d + ':', v)
+        dependencies = loader.dependency_collector.dependencies
+        for d, v in dependencies.items():
+            print('  ', d + ':', ' '.join(v.dependencies))
 
         print('\nActions')
-        for a, v in loader.actions.items():
-            print('  ', a + ':', v)
+        for a, v in dependencies.items():
+            if not v.phony:
+                print('  ', a + ':', v.action.__name__)
 
         return 0
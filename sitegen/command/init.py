@@ -17,9 +17,6 @@ include {rootdir}/etc/Makefile
 
 
 class Init(Command):
-    def _get_command_help(self) -> str:
-        return 'Initialize an empty Site'
-
     def _register_arguments(self, parser):
         parser.add_argument('-d', '--directory', nargs=1, type=str, required=True,
                             help='Base directory of the new site')
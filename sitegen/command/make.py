@@ -1,39 +1,88 @@
 import os
-import yaml
+
 from sitegen.command.command import Command
+from sitegen.profiling import profiler
+from sitegen.siteloader.assets import LINK_MODES
+from sitegen.siteloader.builder import Builder, ParallelBuilder
+from sitegen.siteloader.cache import OutputCache
 from sitegen.siteloader.loader import SiteLoader
+from sitegen.siteloader.output import get_changed_outputs, get_removed_outputs
 
 
 class Make(Command):
-    def __init__(self):
-        super().__init__()
-        self._site_config = dict()
-
-    def _get_command_help(self) -> str:
-        return 'Make (generate) site'
-
     def _register_arguments(self, parser):
         parser.add_argument('-r', '--root', nargs=1, type=str, required=True,
                             help='Site Root')
+        parser.add_argument('--keep-intermediates', action='store_true',
+                            help='Write the compiled pages and their front matter into _build (for debugging)')
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help='Number of actions to run in parallel (default: 1)')
+        parser.add_argument('--link-mode', choices=LINK_MODES, default='copy',
+                            help='How the assets are put into _install (default: copy)')
+        parser.add_argument('--cache-dir', type=str, metavar='DIR',
+                            help='Directory of the output cache (overrides cache.directory in _config.yml)')
+        parser.add_argument('--changed-list', type=str, metavar='FILE',
+                            help='Write the files of _install which were written by the build into FILE, '
+                                 'relative to _install (e.g. for rsync --files-from)')
+        parser.add_argument('--removed-list', type=str, metavar='FILE',
+                            help='Write the files of _install which were removed by the build into FILE, '
+                                 'relative to _install')
+        parser.add_argument('--profile', action='store_true',
+                            help='Print the time spent per phase, action class and the slowest targets')
+        parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                            help='Number of the slowest targets printed by --profile (default: 10)')
+        parser.add_argument('--profile-trace', type=str, metavar='FILE',
+                            help='Write the profile as a Chrome trace event JSON file (implies --profile)')
 
     def _perform(self) -> int:
-        loader = SiteLoader(self._ns.root[0])
+        profiler.enabled = self._ns.profile or bool(self._ns.profile_trace)
+        try:
+            return self._make()
+        finally:
+            if profiler.enabled:
+                profiler.print_report(self._ns.profile_top)
+            if self._ns.profile_trace:
+                profiler.write_trace(self._ns.profile_trace)
+
+    def _make(self) -> int:
+        loader = SiteLoader(self._ns.root[0], keep_intermediates=self._ns.keep_intermediates)
         loader.update()
 
         dependencies = loader.dependency_collector.dependencies
-        site_config_file = os.path.join(self._ns.root[0], '_config.yml')
-
-        if os.path.exists(site_config_file):
-            with open(site_config_file, 'rt') as f:
-                self._site_config.update(yaml.load(f))
+        builder = self._create_builder(dependencies, loader.site_config, loader.build_state)
+        try:
+            result = builder.build()
+            builder.remove_orphans()
+            self._write_changed_list()
+            return result
+        finally:
+            loader.build_state.save()
 
-        return self.__generate_site(dependencies, '__site__')
+    def _write_changed_list(self) -> None:
+        """
+        Writes the lists of the written and the removed files of _install, if requested
+        """
+        # a file may be removed, then written again (or vice versa), only its final state is listed
+        if self._ns.changed_list:
+            self.__write_list(self._ns.changed_list, get_changed_outputs(), exists=True)
+        if self._ns.removed_list:
+            self.__write_list(self._ns.removed_list, get_removed_outputs(), exists=False)
 
-    def __generate_site(self, dependencies, key):
-        entry = dependencies[key]
-        for file in entry.dependencies:
-            if file in dependencies:
-                self.__generate_site(dependencies, file)
+    def __write_list(self, list_path: str, paths, *, exists: bool) -> None:
+        install_dir = os.path.join(self._ns.root[0], '_install')
+        paths = set(path for path in paths if os.path.exists(path) == exists)
+        with open(list_path, 'wt') as f:
+            for path in sorted(os.path.relpath(path, install_dir) for path in paths):
+                if not path.startswith(os.pardir + os.sep):
+                    f.write(path + '\n')
 
-            if not entry.phony:
-                entry.action(entry.name, entry.dependencies, self._ns.root[0], self._site_config).run()
+    def _create_builder(self, dependencies, site_config, build_state, *, keep_going: bool=False) -> Builder:
+        action_options = dict(link_mode=self._ns.link_mode)
+        output_cache = OutputCache.from_config(self._ns.root[0], site_config, self._ns.cache_dir)
+        if self._ns.jobs > 1:
+            return ParallelBuilder(dependencies, self._ns.root[0], site_config, build_state,
+                                   action_options=action_options, output_cache=output_cache,
+                                   keep_going=keep_going, jobs=self._ns.jobs)
+        else:
+            return Builder(dependencies, self._ns.root[0], site_config, build_state,
+                           action_options=action_options, output_cache=output_cache, keep_going=keep_going)
@@ -0,0 +1,134 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import posixpath
+import threading
+from urllib.parse import urlsplit, unquote
+
+from sitegen.command.command import Command
+from sitegen.siteloader.builder import Builder
+from sitegen.siteloader.loader import SiteLoader
+from sitegen.watcher import is_watched_directory
+
+
+class _SiteServer(ThreadingHTTPServer):
+    """
+    HTTP server for _install which builds the requested target if it is outdated
+    """
+
+    def __init__(self, address, site_root: str, keep_intermediates: bool):
+        self.site_root = site_root
+        self.__keep_intermediates = keep_intermediates
+        self.__lock = threading.Lock()
+        self.__loader = None
+        self.__mtimes = dict()
+        self.__load()
+
+        handler = partial(_RequestHandler, directory=os.path.join(site_root, '_install'))
+        super().__init__(address, handler)
+
+    def __load(self):
+        if self.__loader is not None:
+            self.__loader.build_state.save()
+        # taken before the scan, so a change during the scan is noticed later
+        self.__mtimes = self.__get_source_mtimes(self.__walk_source_directories())
+        self.__loader = SiteLoader(self.site_root, keep_intermediates=self.__keep_intermediates)
+        self.__loader.update()
+
+    def __walk_source_directories(self) -> list:
+        directories = list()
+        for root, dirs, files in os.walk(self.site_root):
+            directory = os.path.relpath(root, self.site_root)
+            directory = '' if directory == os.curdir else directory
+            dirs[:] = [d for d in dirs if is_watched_directory(os.path.join(directory, d))]
+            directories.append(directory)
+        return directories
+
+    def __get_source_mtimes(self, directories) -> dict:
+        mtimes = dict()
+        for path in list(directories) + ['_config.yml']:
+            try:
+                mtimes[path] = os.stat(os.path.join(self.site_root, path)).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[path] = None
+        return mtimes
+
+    def __is_changed(self) -> bool:
+        """
+        Returns whether a source file may have been added or removed since the last load
+
+        Adding or removing a file changes the mtime of its directory, so only the
+        directories known from the last load are checked, their contents are not listed.
+        """
+        return self.__get_source_mtimes(self.__mtimes.keys() - {'_config.yml'}) != self.__mtimes
+
+    def prepare(self, target: str):
+        """
+        Builds @target (relative to the site root) if it is known and outdated
+
+        Unknown targets which don't exist may belong to a new source file,
+        so the dependency graph is loaded again for them if a source directory
+        changed since the last load (e.g. not for every request of /favicon.ico).
+        The graph is loaded again if _config.yml changed, as the targets and
+        the actions depend on the configuration.
+        """
+        with self.__lock:
+            if self.__get_source_mtimes([]) != {'_config.yml': self.__mtimes['_config.yml']}:
+                self.__load()
+
+            graph = self.__loader.dependency_collector.graph
+            if not graph.has(target) and not os.path.exists(os.path.join(self.site_root, target)) \
+                    and self.__is_changed():
+                self.__load()
+                graph = self.__loader.dependency_collector.graph
+
+            if graph.has(target):
+                Builder(self.__loader.dependency_collector.dependencies, self.site_root,
+                        self.__loader.site_config, self.__loader.build_state).build([target])
+
+    def server_close(self):
+        super().server_close()
+        self.__loader.build_state.save()
+
+
+class _RequestHandler(SimpleHTTPRequestHandler):
+    def send_head(self):
+        target = self.__get_target(self.path)
+        if target is not None:
+            try:
+                self.server.prepare(target)
+            except Exception as e:
+                self.send_error(500, "Build failed: {}".format(e))
+                return None
+        return super().send_head()
+
+    def __get_target(self, url: str) -> (str, None):
+        path = posixpath.normpath(unquote(urlsplit(url).path))
+        parts = [part for part in path.split('/') if part and part not in (os.curdir, os.pardir)]
+        if url.endswith('/') or not parts:
+            parts.append('index.html')
+        return os.sep.join(['_install'] + parts)
+
+
+class Serve(Command):
+    def _register_arguments(self, parser):
+        parser.add_argument('-r', '--root', nargs=1, type=str, required=True,
+                            help='Site Root')
+        parser.add_argument('-b', '--bind', type=str, default='127.0.0.1',
+                            help='Address to listen on (default: 127.0.0.1)')
+        parser.add_argument('-p', '--port', type=int, default=8000,
+                            help='Port to listen on (default: 8000)')
+        parser.add_argument('--keep-intermediates', action='store_true',
+                            help='Write the compiled pages and their front matter into _build (for debugging)')
+
+    def _perform(self) -> int:
+        server = _SiteServer((self._ns.bind, self._ns.port), self._ns.root[0], self._ns.keep_intermediates)
+        print("Serving {} on http://{}:{}/ (press Ctrl-C to stop)".format(self._ns.root[0], self._ns.bind,
+                                                                          self._ns.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
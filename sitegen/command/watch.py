@@ -0,0 +1,132 @@
+import os
+import time
+
+from sitegen.command.command import Command
+from sitegen.siteloader.base import is_template_path
+from sitegen.siteloader.builder import Builder
+from sitegen.siteloader.constants import FileType
+from sitegen.siteloader.loader import SiteLoader
+from sitegen.siteloader.output import remove_output
+from sitegen.siteloader.search import is_search_enabled
+from sitegen.watcher import create_watcher
+
+
+class Watch(Command):
+    """
+    Keeps the dependency graph in memory and rebuilds the targets affected by the changed files
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__loader = None
+
+    def _register_arguments(self, parser):
+        parser.add_argument('-r', '--root', nargs=1, type=str, required=True,
+                            help='Site Root')
+        parser.add_argument('--keep-intermediates', action='store_true',
+                            help='Write the compiled pages and their front matter into _build (for debugging)')
+        parser.add_argument('--poll', action='store_true',
+                            help='Poll the file system instead of using inotify')
+
+    def _perform(self) -> int:
+        root = self._ns.root[0]
+        self.__load()
+
+        watcher = create_watcher(root, polling=self._ns.poll)
+        print("Watching", root, "(press Ctrl-C to stop)")
+        try:
+            while True:
+                self.__process_changes(watcher.wait())
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            watcher.close()
+
+    def __load(self):
+        self.__loader = SiteLoader(self._ns.root[0], keep_intermediates=self._ns.keep_intermediates)
+        self.__loader.update()
+        # the targets of the removed sources (posts, pages, assets) are removed like by make
+        self.__build(['__site__'], prune=True)
+
+    def __build(self, targets, *, prune: bool=False):
+        loader = self.__loader
+        try:
+            builder = Builder(loader.dependency_collector.dependencies, self._ns.root[0], loader.site_config,
+                              loader.build_state)
+            builder.build(targets)
+            if prune:
+                builder.remove_orphans()
+        except Exception as e:
+            print("Build failed:", e)
+        finally:
+            loader.build_state.save()
+
+    def __process_changes(self, paths):
+        start = time.monotonic()
+        graph = self.__loader.dependency_collector.graph
+
+        changed = set()
+        reload = False
+        for path in sorted(paths):
+            exists = os.path.exists(os.path.join(self._ns.root[0], path))
+            file_type = self.__loader.get_file_type(path)
+            if path == '_config.yml':
+                # the configuration changes the targets as well (e.g. the pages of the archive,
+                # the compressed files, the fingerprints, the search index), the graph is loaded again
+                reload = True
+            elif is_template_path(path) and file_type is None:
+                # the templates referenced by the changed one may have changed as well,
+                # the graph is loaded again, and only the pages using it are rebuilt
+                reload = True
+            elif not exists and (file_type == FileType.blog or
+                                 file_type == FileType.page and is_search_enabled(self.__loader.site_config)):
+                # the listings of the posts and the search index are not removed with the page,
+                # the graph is loaded again
+                reload = True
+            elif not exists and file_type in (FileType.asset, FileType.theme) and self.__loader.fingerprints.is_enabled():
+                # the pages referencing a fingerprinted asset depend on it, the graph is loaded again
+                reload = True
+            elif not exists and graph.has_dependents(path):
+                self.__remove_derived_targets(path)
+            elif not exists and file_type is not None:
+                # probably a removed directory, the graph is loaded again
+                reload = True
+            elif not exists:
+                continue
+            elif graph.has_dependents(path):
+                if file_type is not None:
+                    # the layout, or the tags of a post may have changed, or the fingerprint of an asset
+                    self.__loader.add_file(path)
+                changed.add(path)
+            else:
+                self.__loader.add_file(path)
+                changed.add(path)
+
+        if reload:
+            self.__load()
+            return
+
+        targets = sorted(self.__get_affected_targets(changed))
+        if targets:
+            self.__build(targets)
+            print("Rebuilt in {:.0f} ms".format((time.monotonic() - start) * 1000))
+
+    def __get_affected_targets(self, paths) -> set:
+        graph = self.__loader.dependency_collector.graph
+        affected = set()
+        pending = list(paths)
+        while pending:
+            for dependent in graph.dependents(pending.pop()):
+                if dependent not in affected and not graph.get_entry(dependent).phony:
+                    affected.add(dependent)
+                    pending.append(dependent)
+        return affected
+
+    def __remove_derived_targets(self, path: str):
+        graph = self.__loader.dependency_collector.graph
+        for target in self.__get_affected_targets([path]):
+            print("Removing", target)
+            graph.remove(target)
+            self.__loader.build_state.forget(target)
+
+            remove_output(os.path.join(self._ns.root[0], target))
@@ -0,0 +1,108 @@
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import os
+import time
+
+Event = namedtuple('Event', 'phase action target start wall cpu pid')
+
+
+class Profiler:
+    """
+    Records the wall and CPU time of the build phases
+
+    The phases are recorded with the action and the target being built, so the
+    report can show the totals per phase and per action class, and the slowest
+    targets. Recording is a no-op unless the profiler is enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.__events = list()
+        self.__action = ''
+        self.__target = ''
+
+    def reset(self):
+        self.__events = list()
+
+    @property
+    def events(self) -> list:
+        return list(self.__events)
+
+    def add_events(self, events):
+        self.__events.extend(Event(*event) for event in events)
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.__events.append(Event(name, self.__action, self.__target, start, time.perf_counter() - start,
+                                       time.process_time() - cpu_start, os.getpid()))
+
+    @contextmanager
+    def action(self, action: str, target: str):
+        """
+        Records the whole action as the 'action' phase, and the phases within it with @action and @target
+        """
+        self.__action, self.__target = action, target
+        try:
+            with self.phase('action'):
+                yield
+        finally:
+            self.__action, self.__target = '', ''
+
+    def print_report(self, top: int=10):
+        print('\nProfile (wall / CPU seconds):')
+
+        print('  Phases:')
+        for name, (wall, cpu, count) in self.__sum_by(lambda e: e.phase):
+            print('    {:<30} {:>9.3f} {:>9.3f}  ({} calls)'.format(name, wall, cpu, count))
+
+        print('  Actions:')
+        for name, (wall, cpu, count) in self.__sum_by(lambda e: e.action if e.phase == 'action' else None):
+            print('    {:<30} {:>9.3f} {:>9.3f}  ({} targets)'.format(name, wall, cpu, count))
+
+        print('  Slowest targets:')
+        actions = sorted((e for e in self.__events if e.phase == 'action'), key=lambda e: e.wall, reverse=True)
+        for event in actions[:top]:
+            print('    {:<50} {:>9.3f} {:>9.3f}'.format(event.target, event.wall, event.cpu))
+
+    def __sum_by(self, key) -> list:
+        totals = dict()
+        for event in self.__events:
+            name = key(event)
+            if name is None:
+                continue
+            wall, cpu, count = totals.get(name, (0.0, 0.0, 0))
+            totals[name] = (wall + event.wall, cpu + event.cpu, count + 1)
+        return sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+
+    def write_trace(self, path: str):
+        """
+        Writes the events in the Chrome trace event format (chrome://tracing, Perfetto)
+        """
+        trace_events = [
+            {
+                'name': event.phase if event.phase != 'action' else event.action,
+                'cat': event.phase,
+                'ph': 'X',
+                'ts': event.start * 1e6,
+                'dur': event.wall * 1e6,
+                'pid': event.pid,
+                'tid': event.pid,
+                'args': {'target': event.target, 'action': event.action, 'cpu_ms': event.cpu * 1e3},
+            }
+            for event in self.__events
+        ]
+        with open(path, 'wt') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+profiler = Profiler()
@@ -1,28 +1,169 @@
+import errno
+import fcntl
 import os
 import shutil
 
+from sitegen.profiling import profiler
 from sitegen.siteloader.base import FSDependencyObserver
 from sitegen.siteloader.dependency import Action
+from sitegen.siteloader.fingerprint import MANIFEST_TARGET, ManifestAction, get_asset_name
+from sitegen.siteloader.output import TMP_SUFFIX, ensure_directory, record_changed_output, recreate_directory
+from sitegen.siteloader.state import file_digest
+
+LINK_MODES = ('copy', 'hardlink', 'reflink')
+
+# from linux/fs.h
+_FICLONE = 0x40049409
+
+
+def _copy_file(path: str, target_path: str) -> None:
+    """
+    Copies the contents of a file within the kernel if possible (copy_file_range, then sendfile)
+    """
+    if not hasattr(os, 'copy_file_range'):
+        shutil.copyfile(path, target_path)
+        return
+
+    with open(path, 'rb') as src, open(target_path, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        try:
+            copied = 0
+            while copied < size:
+                count = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst)
+
+
+def _reflink_file(path: str, target_path: str) -> None:
+    with open(path, 'rb') as src, open(target_path, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    _copy_file(path, target_path)
+
+
+def _link_file(path: str, target_path: str) -> None:
+    try:
+        os.link(path, target_path)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        _copy_file(path, target_path)
 
 
 class CopyAction(Action):
+    """
+    Synchronizes a file to its target
+
+    The file is not copied if the target has the same size and mtime or the same content.
+    The 'link_mode' keyword argument selects how the target is created:
+    'copy' (default), 'hardlink' or 'reflink'; both fall back to copying if not supported.
+    The new file is created next to the target, then renamed to it.
+    """
+
     max_deps_count = 1
 
     def run(self):
-        path = self.dependencies[0]
-        print("Copying", path, "to", self.target_path)
-
-        path = os.path.join(self._site_root, path)
+        path = os.path.join(self._site_root, self.dependencies[0])
         target_path = os.path.join(self._site_root, self.target_path)
-        if not os.path.exists(os.path.dirname(target_path)):
-            os.makedirs(os.path.dirname(target_path))
 
-        shutil.copyfile(path, target_path)
+        if self.__is_up_to_date(path, target_path):
+            return
+
+        print("Copying", self.dependencies[0], "to", self.target_path)
+
+        ensure_directory(target_path)
+        tmp_path = target_path + TMP_SUFFIX
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+
+        with profiler.phase('copy'):
+            try:
+                self.__create_file(path, tmp_path)
+            except FileNotFoundError:
+                if os.path.isdir(os.path.dirname(tmp_path)):
+                    raise
+                recreate_directory(tmp_path)
+                self.__create_file(path, tmp_path)
+
+        if not os.path.samefile(path, tmp_path):
+            shutil.copystat(path, tmp_path)
+        os.replace(tmp_path, target_path)
+        record_changed_output(target_path)
+
+    def __create_file(self, path: str, tmp_path: str) -> None:
+        link_mode = self.kwargs.get('link_mode') or 'copy'
+        if link_mode == 'hardlink':
+            _link_file(path, tmp_path)
+        elif link_mode == 'reflink':
+            _reflink_file(path, tmp_path)
+        else:
+            _copy_file(path, tmp_path)
+
+    @staticmethod
+    def __is_up_to_date(path: str, target_path: str) -> bool:
+        try:
+            target_st = os.stat(target_path)
+        except FileNotFoundError:
+            return False
+
+        st = os.stat(path)
+        if st.st_size != target_st.st_size:
+            return False
+        if st.st_mtime_ns == target_st.st_mtime_ns:
+            return True
+
+        return file_digest(path) == file_digest(target_path)
 
 
 class CopyObserver(FSDependencyObserver):
+    """
+    Registers the copying of the assets into _install
+
+    With @fingerprints enabled (see Fingerprints) the targets get content-hash names,
+    and _install/asset-manifest.json maps the names of the assets to them.
+    """
+
+    def __init__(self, site_root: str, dependency_collector, fingerprints=None):
+        super().__init__(site_root, dependency_collector)
+        self.__fingerprints = fingerprints
+
     def notify(self, directory: str, entry: str):
         path = os.path.join(directory, entry)
-        install_target_path = os.path.join('_install', path)
-        self._dependency_collector.add_site_dependency([install_target_path])
-        self._dependency_collector.add_dependency(install_target_path, [path], CopyAction)
+        name = get_asset_name(path)
+        if self.__fingerprints is not None and self.__fingerprints.is_enabled(name):
+            name = self.__fingerprints.get_name(name)
+            self.__fingerprints.add_source(path)
+        install_target_path = os.path.join('_install', name)
+
+        # the name of a changed asset changes with fingerprinting, the previous target is removed
+        collector = self._dependency_collector
+        for target in list(collector.graph.dependents(path)):
+            if target != install_target_path and collector.graph.get_entry(target).action is CopyAction:
+                collector.remove(target)
+
+        if not collector.graph.has(install_target_path):
+            collector.add_site_dependency([install_target_path])
+            collector.add_dependency(install_target_path, [path], CopyAction)
+
+    def finish(self):
+        if self.__fingerprints is None or not self.__fingerprints.is_enabled():
+            return
+
+        collector = self._dependency_collector
+        if collector.graph.has(MANIFEST_TARGET):
+            collector.remove(MANIFEST_TARGET)
+        sources = self.__fingerprints.sources
+        if sources:
+            collector.add_site_dependency([MANIFEST_TARGET])
+            collector.add_dependency(MANIFEST_TARGET, sources, ManifestAction)
@@ -1,10 +1,33 @@
-from collections.abc import Sequence
+from collections import ChainMap
+from collections.abc import Mapping, Sequence
 import os
-import yaml
 
 from sitegen.siteloader.dependency import Dependencies, Action
+from sitegen.siteloader.fingerprint import Fingerprints, get_asset_source_path
+from sitegen.siteloader.output import ensure_directory
+from sitegen.siteloader.yamlloader import load_front_matter
 
-from sitegen.templates import File
+from sitegen.profiling import profiler
+from sitegen.templates import File, TemplateRenderer
+
+LAYOUTS_DIRECTORY = '_layouts'
+THEME_DIRECTORY = os.path.join('templates', 'current')
+DEFAULT_LAYOUT = 'default'
+
+
+def get_template_roots(site_root: str) -> list:
+    """
+    Returns the directories of the page templates: the layouts of the site override the theme
+    """
+    return [os.path.join(site_root, LAYOUTS_DIRECTORY), os.path.join(site_root, THEME_DIRECTORY)]
+
+
+def get_layout_template(layout: (str, None)) -> str:
+    return (layout or DEFAULT_LAYOUT) + '.tpl'
+
+
+def is_template_path(path: str) -> bool:
+    return path.startswith(LAYOUTS_DIRECTORY + os.sep) or path.startswith(THEME_DIRECTORY + os.sep)
 
 
 class FileSystemObserver:
@@ -14,17 +37,41 @@ class FileSystemObserver:
     def notify(self, directory: str, entry: str):
         pass
 
+    def finish(self):
+        """
+        Called when all files are processed, e.g. to add entries depending on several files
+        """
+        pass
+
 
 class DependencyCollector:
     def __init__(self):
         self._dependencies = Dependencies()
+        self.__target_observers = list()
+        self.__derived_targets = dict()
 
     @property
     def dependencies(self) -> dict:
         return self._dependencies.dependencies
 
+    @property
+    def graph(self) -> Dependencies:
+        return self._dependencies
+
+    def add_target_observer(self, observer) -> None:
+        """
+        Registers @observer(target), called for each target of the site
+
+        The observer can add targets generated from the target, and returns them,
+        so they are removed together with the target.
+        """
+        self.__target_observers.append(observer)
+
     def add_site_dependency(self, dependencies: Sequence):
         self.add_virtual_dependency('__site__', dependencies)
+        for target in dependencies:
+            for observer in self.__target_observers:
+                self.__derived_targets.setdefault(target, list()).extend(observer(target))
 
     def add_dependency(self, key: str, dependencies: Sequence, action: (Action, None)=None) -> None:
         if type(dependencies) == str:
@@ -32,6 +79,12 @@ class DependencyCollector:
         for d in dependencies:
             self._dependencies.add(key, d, action=action)
 
+    def remove(self, key: str) -> None:
+        for target in self.__derived_targets.pop(key, ()):
+            if self._dependencies.has(target):
+                self.remove(target)
+        self._dependencies.remove(key)
+
     def add_virtual_dependency(self, key: str, dependencies: Sequence, action: (Action, None)=None):
         if type(dependencies) == str:
             raise Exception("Dependencies in DependencyCollector cannot be str")
@@ -39,6 +92,40 @@ class DependencyCollector:
             self._dependencies.add(key, d, action=action, phony=True)
 
 
+class TemplateDependencies:
+    """
+    Finds the template files (relative to the site root) used to render the pages of a layout
+
+    With @fingerprints enabled the sources of the fingerprinted assets referenced by the templates
+    with asset('...') are returned as well, as the pages contain their content-hash names.
+    The templates are parsed once per layout, the result is kept while the dependency graph is loaded.
+    """
+
+    def __init__(self, site_root: str, fingerprints: (Fingerprints, None)=None):
+        self._site_root = site_root
+        self.__fingerprints = fingerprints
+        self.__renderer = TemplateRenderer.get(get_template_roots(site_root))
+        self.__files = dict()
+        self.__assets = dict()
+
+    def get(self, layout: (str, None)) -> list:
+        template = get_layout_template(layout)
+        if template not in self.__files:
+            self.__files[template] = [os.path.relpath(path, self._site_root)
+                                      for path in self.__renderer.get_template_files(template)]
+        if self.__fingerprints is None or not self.__fingerprints.is_enabled():
+            return self.__files[template]
+        return self.__files[template] + self.__get_assets(template)
+
+    def __get_assets(self, template: str) -> list:
+        if template not in self.__assets:
+            names = set(os.path.normpath(name.lstrip('/')) for name in
+                        self.__renderer.get_call_arguments(template, 'asset'))
+            self.__assets[template] = sorted(get_asset_source_path(name) for name in names
+                                             if self.__fingerprints.is_enabled(name))
+        return self.__assets[template]
+
+
 class FSDependencyObserver(FileSystemObserver):
     def __init__(self, site_root: str, dependency_collector: DependencyCollector):
         super().__init__(site_root)
@@ -46,18 +133,32 @@ class FSDependencyObserver(FileSystemObserver):
 
 
 class FinalHtmlAction(Action):
-    max_deps_count = 2
+    """
+    Renders a page with its layout template
+
+    The dependencies are the compiled page, its front matter, then the template files
+    the layout uses (see TemplateDependencies). The templates can get the URL of an
+    asset (fingerprinted if enabled) with asset('css/style.css').
+    """
+
+    implicit_dependencies = ('_config.yml',)
+    cacheable = True
 
     def run(self):
-        root = '_install'
-        template_dir = os.path.join('templates', 'current')
         path = os.path.join(self._site_root, self.dependencies[0])
         yaml_path = os.path.join(self._site_root, self.dependencies[1])
         with open(path, 'rt') as f:
             input_text = f.read()
-        with open(yaml_path, 'rt') as f:
-            yaml_object = yaml.load(f.read())
-        self.__render(template_dir, input_text, yaml_object, root)
+        with open(yaml_path, 'rt') as f, profiler.phase('yaml'):
+            yaml_object = load_front_matter(f.read())
+        self.render(input_text, yaml_object)
+
+    def render(self, content: str, yaml_object) -> None:
+        """
+        Renders the final HTML file from the page content and its front matter
+        """
+        layout = yaml_object.get('layout') if isinstance(yaml_object, Mapping) else None
+        self.__render(get_layout_template(layout), content, yaml_object, '_install')
 
     def __get_root_dir(self, root: str) -> str:
         sub_path = self.target_path[len(root):].lstrip(os.sep)
@@ -65,22 +166,28 @@ class FinalHtmlAction(Action):
         root_dir = os.curdir if count == 0 else os.pardir + (os.sep + os.pardir) * (count - 1)
         return root_dir
 
-    def __render(self, template_dir: str, content: str, yaml_object, root: str) -> None:
+    def __get_bytecode_cache_dir(self) -> (str, None):
+        if self._site_config.get('templates', {}).get('bytecode_cache'):
+            return os.path.join(self._site_root, '_build', '.jinja-cache')
+        return None
+
+    def __render(self, template: str, content: str, yaml_object, root: str) -> None:
         print("Generating", self.target_path)
-        template_path = os.path.join(template_dir, 'default.tpl')
 
-        site_config = dict(self._site_config)
-        site_config['root_dir'] = self.__get_root_dir(root)
+        site_config = ChainMap({'root_dir': self.__get_root_dir(root)}, self._site_config)
 
+        fingerprints = Fingerprints(self._site_root, self._site_config)
         mapping = {
             'content': content,
             'site': site_config,
-            'page': yaml_object
+            'page': yaml_object,
+            'asset': lambda name: fingerprints.get_url(name, site_config['root_dir']),
         }
 
         target_path = os.path.join(self._site_root, self.target_path)
-        if not os.path.exists(os.path.dirname(target_path)):
-            os.makedirs(os.path.dirname(target_path))
+        ensure_directory(target_path)
 
-        file = File(template_path, mapping, target_path, template_root=self._site_root)
+        file = File(template, mapping, target_path,
+                    template_root=get_template_roots(self._site_root),
+                    bytecode_cache_dir=self.__get_bytecode_cache_dir())
         file.update()
@@ -0,0 +1,336 @@
+from collections.abc import Mapping, Sequence
+from contextlib import redirect_stdout
+import io
+import os
+from types import MappingProxyType
+
+from sitegen.profiling import profiler
+from sitegen.siteloader.output import (add_changed_outputs, forget_directory, get_changed_outputs, get_removed_outputs,
+                                      remove_output, reset_changed_outputs)
+from sitegen.siteloader.state import file_digest
+
+
+class Builder:
+    """
+    Builds the targets of the dependency graph by running their actions
+
+    The actions get a read-only view of the @site_config, and the @action_options
+    as keyword arguments. The outputs of the cacheable actions are taken from the
+    @output_cache if possible, and stored there after running the action otherwise.
+
+    The build stops at the first failing action, unless @keep_going is set: then the
+    targets depending on the failed ones are skipped, the others are built, and build()
+    returns 1.
+    """
+
+    def __init__(self, dependencies: Mapping, site_root: str, site_config: Mapping, build_state=None, *,
+                 action_options: (Mapping, None)=None, output_cache=None, keep_going: bool=False):
+        self._dependencies = dependencies
+        self._site_root = site_root
+        self._site_config = MappingProxyType(site_config)
+        self._build_state = build_state
+        self._action_options = dict(action_options or {})
+        self._output_cache = output_cache
+        self._keep_going = keep_going
+
+    def build(self, keys: Sequence=('__site__',)) -> int:
+        self._start()
+
+        for name in self._walk(keys):
+            entry = self._dependencies[name]
+            if entry.phony or self._has_failed_dependency(entry):
+                continue
+            if entry.update_need_rebuild(self._site_root, self._build_state):
+                action = self._create_action(entry)
+                cache_key = self._get_cache_key(entry, action)
+                try:
+                    with profiler.action(entry.action.__name__, entry.name):
+                        restored = self._restore(action, cache_key)
+                        if not restored:
+                            action.run()
+                            self._store(action, cache_key)
+                except Exception as e:
+                    self._fail(entry, e)
+                    continue
+                self._record(entry, restored=restored)
+            else:
+                self._skipped_count += 1
+
+        return self._finish()
+
+    def get_outdated(self, keys: Sequence=('__site__',)) -> list:
+        """
+        Returns the targets which build(@keys) would build, without running the actions
+
+        A target is listed if it is outdated, or one of its dependencies is listed.
+        """
+        outdated = list()
+        names = set()
+        for name in self._walk(keys):
+            entry = self._dependencies[name]
+            if entry.phony:
+                continue
+            if any(file in names for file in entry.dependencies) or \
+                    entry.update_need_rebuild(self._site_root, self._build_state):
+                names.add(name)
+                outdated.append(name)
+        return outdated
+
+    def _walk(self, keys: Sequence) -> list:
+        """
+        Returns the names of the entries reachable from @keys, each entry after its dependencies
+        """
+        order = list()
+        visited = set()
+        for key in keys:
+            self.__visit(key, order, visited, list())
+        return order
+
+    def __visit(self, key: str, order: list, visited: set, path: list):
+        if key in visited:
+            return
+        if key in path:
+            cycle = path[path.index(key):] + [key]
+            raise Exception("Dependency cycle detected: {}".format(' -> '.join(cycle)))
+
+        path.append(key)
+        for file in self._dependencies[key].dependencies:
+            if file in self._dependencies:
+                self.__visit(file, order, visited, path)
+        path.pop()
+
+        visited.add(key)
+        order.append(key)
+
+    def _create_action(self, entry, site_config: (Mapping, None)=None):
+        if site_config is None:
+            site_config = self._site_config
+        return entry.action(entry.name, list(entry.dependencies), self._site_root, site_config,
+                            **self._action_options)
+
+    def _start(self):
+        # the changed outputs are collected per build, long running processes (watch, serve) build many times
+        reset_changed_outputs()
+        self._run_count = 0
+        self._skipped_count = 0
+        self._restored_count = 0
+        self._failed = set()
+
+    def _fail(self, entry, error: Exception):
+        if not self._keep_going:
+            raise error
+        print("Failed to build {}: {}".format(entry.name, error))
+        self._failed.add(entry.name)
+
+    def _has_failed_dependency(self, entry) -> bool:
+        if not any(file in self._failed for file in entry.dependencies):
+            return False
+        print("Skipping", entry.name, "as a dependency failed")
+        self._failed.add(entry.name)
+        return True
+
+    def _record(self, entry, *, restored: bool=False):
+        if restored:
+            self._restored_count += 1
+        else:
+            self._run_count += 1
+        if self._build_state is not None:
+            self._build_state.record(entry.name, entry.action, entry.inputs)
+
+    def _get_cache_key(self, entry, action) -> (str, None):
+        """
+        Returns the key of the outputs of @action in the output cache, or None if they are not cached
+        """
+        if self._output_cache is None or not action.cacheable:
+            return None
+
+        inputs = entry.inputs
+        digests = [self.__get_digest(path) for path in inputs]
+        if None in digests:
+            return None
+
+        return self._output_cache.get_key(action, inputs, digests)
+
+    def __get_digest(self, path: str) -> (str, None):
+        if self._build_state is not None:
+            return self._build_state.digest(path)
+        try:
+            return file_digest(os.path.join(self._site_root, path))
+        except FileNotFoundError:
+            return None
+
+    def _restore(self, action, cache_key: (str, None)) -> bool:
+        if cache_key is None:
+            return False
+
+        with profiler.phase('cache'):
+            if not self._output_cache.restore(cache_key, self.__get_output_paths(action)):
+                return False
+
+        print("Restoring", action.target_path, "from the cache")
+        return True
+
+    def _store(self, action, cache_key: (str, None)) -> None:
+        if cache_key is not None:
+            with profiler.phase('cache'):
+                self._output_cache.store(cache_key, self.__get_output_paths(action))
+
+    def __get_output_paths(self, action) -> list:
+        return [os.path.join(self._site_root, path) for path in action.get_outputs()]
+
+    def _finish(self) -> int:
+        if self._output_cache is not None:
+            self._output_cache.trim()
+        self._report()
+        return 1 if self._failed else 0
+
+    def remove_orphans(self, directory: str='_install', *, dry_run: bool=False) -> None:
+        """
+        Removes the files of @directory which are not written by the actions of the dependency graph
+
+        Files and directories with a leading '.' are kept, e.g. the state files in _build.
+        """
+        outputs = self.__get_all_outputs()
+        top = os.path.join(self._site_root, directory)
+        for root, dirs, files in os.walk(top, topdown=False):
+            if any(part.startswith('.') for part in os.path.relpath(root, top).split(os.sep) if part != os.curdir):
+                continue
+
+            for entry in files:
+                path = os.path.join(root, entry)
+                target = os.path.relpath(path, self._site_root)
+                if entry.startswith('.') or target in outputs:
+                    continue
+                if dry_run:
+                    print("Would remove", target)
+                    continue
+                print("Removing", target)
+                remove_output(path)
+                if self._build_state is not None:
+                    self._build_state.forget(target)
+
+            if root != top and not dry_run and not os.listdir(root):
+                os.rmdir(root)
+                forget_directory(root)
+
+    def __get_all_outputs(self) -> set:
+        """
+        Returns the targets and the other outputs of the actions (e.g. the front matter of the compiled pages)
+        """
+        outputs = set(self._dependencies)
+        for entry in self._dependencies.values():
+            if not entry.phony:
+                outputs.update(self._create_action(entry).get_outputs())
+        return outputs
+
+    def _report(self):
+        report = "Actions: {} run, {} up to date".format(self._run_count, self._skipped_count)
+        if self._restored_count:
+            report += ", {} restored from the cache".format(self._restored_count)
+        if self._failed:
+            report += ", {} failed or skipped".format(len(self._failed))
+        print(report)
+
+
+_worker_site_config = MappingProxyType({})
+
+
+def _init_worker(site_config: dict):
+    global _worker_site_config
+    _worker_site_config = MappingProxyType(site_config)
+
+
+def _run_action(action, profile: bool) -> tuple:
+    # the site configuration is passed once per worker, not with each action
+    action._site_config = _worker_site_config
+    profiler.enabled = profile
+    profiler.reset()
+    reset_changed_outputs()
+
+    output = io.StringIO()
+    with redirect_stdout(output), profiler.action(action.__class__.__name__, action.target_path):
+        action.run()
+    return output.getvalue(), profiler.events, get_changed_outputs(), get_removed_outputs()
+
+
+class ParallelBuilder(Builder):
+    """
+    Runs the actions in a process pool
+
+    The targets are grouped into levels: a target is on a higher level than all of
+    its dependencies, so the targets of a level can be built in parallel once the
+    previous levels are done. The output of the actions is printed in the order of the
+    target names, and the build stops at the first failing action (see @keep_going).
+    """
+
+    def __init__(self, dependencies: Mapping, site_root: str, site_config: Mapping, build_state=None, *,
+                 action_options: (Mapping, None)=None, output_cache=None, keep_going: bool=False, jobs: int):
+        super().__init__(dependencies, site_root, site_config, build_state, action_options=action_options,
+                         output_cache=output_cache, keep_going=keep_going)
+        self._jobs = jobs
+
+    def build(self, keys: Sequence=('__site__',)) -> int:
+        self._start()
+
+        levels = self.__get_levels(keys)
+        # concurrent.futures and multiprocessing are imported only for parallel builds
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self._jobs, initializer=_init_worker,
+                                 initargs=(dict(self._site_config),)) as executor:
+            for level in levels:
+                self.__build_level(executor, level)
+
+        return self._finish()
+
+    def __build_level(self, executor, level):
+        from concurrent.futures import wait, ALL_COMPLETED, FIRST_EXCEPTION
+
+        entries = list()
+        for entry in level:
+            if self._has_failed_dependency(entry):
+                continue
+            if not entry.update_need_rebuild(self._site_root, self._build_state):
+                self._skipped_count += 1
+                continue
+
+            action = self._create_action(entry)
+            cache_key = self._get_cache_key(entry, action)
+            if self._restore(action, cache_key):
+                self._record(entry, restored=True)
+            else:
+                entries.append((entry, action, cache_key))
+
+        # the outputs (see _store()) may depend on the site configuration, so only the
+        # copies of the actions sent to the workers are created without it
+        futures = [executor.submit(_run_action, self._create_action(entry, {}), profiler.enabled)
+                   for entry, action, cache_key in entries]
+
+        done, not_done = wait(futures, return_when=ALL_COMPLETED if self._keep_going else FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+
+        for (entry, action, cache_key), future in zip(entries, futures):
+            if future.cancelled():
+                continue
+            try:
+                output, events, changed_outputs, removed_outputs = future.result()
+            except Exception as e:
+                self._fail(entry, e)
+                continue
+            print(output, end='')
+            profiler.add_events(events)
+            add_changed_outputs(changed_outputs, removed_outputs)
+            self._store(action, cache_key)
+            self._record(entry)
+
+    def __get_levels(self, keys: Sequence) -> list:
+        levels = dict()
+        grouped = dict()
+        for name in self._walk(keys):
+            entry = self._dependencies[name]
+            levels[name] = max([levels[file] + 1 for file in entry.dependencies if file in levels], default=0)
+            if not entry.phony:
+                grouped.setdefault(levels[name], list()).append(entry)
+
+        return [sorted(grouped[level], key=lambda e: e.name) for level in sorted(grouped)]
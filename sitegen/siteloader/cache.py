@@ -0,0 +1,137 @@
+from collections.abc import Mapping, Sequence
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from sitegen.siteloader.output import ensure_directory, write_file
+from sitegen.siteloader.state import action_name
+
+# Changing the format of the key or of the entries needs a new version
+CACHE_VERSION = 1
+
+DEFAULT_MAX_SIZE = 1024  # MB
+
+# temporary directories of interrupted stores are removed after this time
+_STALE_TMP_SECONDS = 24 * 3600
+
+
+class OutputCache:
+    """
+    Content-addressed cache of the outputs of the actions, can be shared between checkouts and machines
+
+    The key of an entry is the hash of the action class, the target path, and the paths and
+    contents of all inputs (the templates and _config.yml are inputs as well), so an entry can
+    be used by any checkout with the same inputs. An entry is a directory of the output files;
+    it is created under a temporary name and renamed, so concurrent builds (e.g. with the cache on
+    an NFS mount) see either a complete entry or none. The mtime of an entry is updated when it is
+    used, and the least recently used entries are removed when the cache grows above @max_size bytes.
+    """
+
+    def __init__(self, directory: str, *, max_size: int):
+        self.__directory = directory
+        self.__max_size = max_size
+        self.__stored = False
+
+    @classmethod
+    def from_config(cls, site_root: str, site_config: Mapping, directory: (str, None)=None):
+        """
+        Returns the cache configured by the 'cache' key of _config.yml or None
+
+        @directory overrides the configured directory, which is relative to the site root.
+        """
+        config = site_config.get('cache') or {}
+        if directory is None:
+            if not config.get('directory'):
+                return None
+            directory = os.path.join(site_root, config['directory'])
+
+        max_size = int(config.get('max_size', DEFAULT_MAX_SIZE)) * 1024 * 1024
+        return cls(directory, max_size=max_size)
+
+    @staticmethod
+    def get_key(action, inputs: Sequence, digests: Sequence) -> str:
+        """
+        Returns the key of the outputs of @action, @digests are the digests of the @inputs
+        """
+        data = [CACHE_VERSION, action_name(action.__class__), action.target_path, list(zip(inputs, digests))]
+        return hashlib.sha256(json.dumps(data, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    def restore(self, key: str, paths: Sequence) -> bool:
+        """
+        Writes the outputs stored with @key to @paths, returns False if there is no such entry
+        """
+        entry = self.__get_entry_path(key)
+        if not os.path.isdir(entry):
+            return False
+
+        try:
+            for index, path in enumerate(paths):
+                ensure_directory(path)
+                with open(os.path.join(entry, str(index)), 'rb') as f:
+                    write_file(path, f.read())
+            os.utime(entry)
+        except FileNotFoundError:
+            # removed meanwhile by another build
+            return False
+
+        return True
+
+    def store(self, key: str, paths: Sequence) -> None:
+        """
+        Stores the files of @paths with @key, unless an entry already exists
+        """
+        entry = self.__get_entry_path(key)
+        if os.path.isdir(entry):
+            return
+
+        os.makedirs(self.__directory, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.__directory)
+        try:
+            for index, path in enumerate(paths):
+                shutil.copyfile(path, os.path.join(tmp_dir, str(index)))
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # e.g. the same entry was stored by another build meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self.__stored = True
+
+    def trim(self) -> None:
+        """
+        Removes the least recently used entries if the cache is larger than its maximum size
+        """
+        if not self.__stored:
+            return
+
+        entries = list()
+        total_size = 0
+        now = time.time()
+        with os.scandir(self.__directory) as it:
+            for prefix in it:
+                if prefix.name.startswith('.tmp-'):
+                    if prefix.stat().st_mtime < now - _STALE_TMP_SECONDS:
+                        shutil.rmtree(prefix.path, ignore_errors=True)
+                    continue
+                if not prefix.is_dir():
+                    continue
+                for entry in os.scandir(prefix.path):
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                    total_size += size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_size <= self.__max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+
+        self.__stored = False
+
+    def __get_entry_path(self, key: str) -> str:
+        return os.path.join(self.__directory, key[:2], key)
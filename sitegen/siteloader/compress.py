@@ -0,0 +1,117 @@
+from collections.abc import Mapping
+import gzip
+import importlib.util
+import os
+
+from sitegen.profiling import profiler
+from sitegen.siteloader.base import FSDependencyObserver
+from sitegen.siteloader.dependency import Action
+from sitegen.siteloader.output import remove_output, write_file
+
+FORMAT_EXTENSIONS = {
+    'gzip': '.gz',
+    'brotli': '.br',
+}
+
+DEFAULT_FORMATS = ('gzip',)
+DEFAULT_TYPES = ('html', 'css', 'js', 'svg')
+DEFAULT_LEVEL = 9
+DEFAULT_BROTLI_LEVEL = 11
+DEFAULT_MIN_SIZE = 256
+
+
+def is_compress_enabled(site_config: Mapping) -> bool:
+    return bool(site_config.get('compress'))
+
+
+def _get_compress_config(site_config: Mapping) -> dict:
+    config = site_config.get('compress')
+    if not isinstance(config, Mapping):
+        config = {}
+    return {
+        'formats': config.get('formats') or DEFAULT_FORMATS,
+        'types': config.get('types') or DEFAULT_TYPES,
+        'level': int(config.get('level', DEFAULT_LEVEL)),
+        'brotli_level': int(config.get('brotli_level', DEFAULT_BROTLI_LEVEL)),
+        'min_size': int(config.get('min_size', DEFAULT_MIN_SIZE)),
+    }
+
+
+class CompressObserver(FSDependencyObserver):
+    """
+    Registers the precompressed variants (.gz and .br) of the targets in _install
+
+    Only the files with the configured extensions are compressed, if the 'compress' key of
+    _config.yml is true or a mapping (see README.md). Brotli needs the 'brotli' module, it is skipped without it.
+    """
+
+    def __init__(self, site_root: str, dependency_collector, site_config: Mapping):
+        super().__init__(site_root, dependency_collector)
+        self.__site_config = site_config
+        self.__brotli_warning_printed = False
+
+    def notify_target(self, target: str) -> list:
+        if not is_compress_enabled(self.__site_config) or not target.startswith('_install' + os.sep):
+            return []
+
+        config = _get_compress_config(self.__site_config)
+        if os.path.splitext(target)[1][1:] not in config['types']:
+            return []
+
+        targets = list()
+        for compress_format in config['formats']:
+            if compress_format not in FORMAT_EXTENSIONS:
+                raise Exception("Unknown compression format; format='{}'".format(compress_format))
+            if compress_format == 'brotli' and not self.__has_brotli():
+                continue
+
+            compressed_target = target + FORMAT_EXTENSIONS[compress_format]
+            self._dependency_collector.add_site_dependency([compressed_target])
+            self._dependency_collector.add_dependency(compressed_target, [target], CompressAction)
+            targets.append(compressed_target)
+
+        return targets
+
+    def __has_brotli(self) -> bool:
+        if importlib.util.find_spec('brotli') is not None:
+            return True
+        if not self.__brotli_warning_printed:
+            print("The brotli module is not installed, .br files are not generated")
+            self.__brotli_warning_printed = True
+        return False
+
+
+class CompressAction(Action):
+    """
+    Writes the gzip or brotli compressed variant of a target, depending on the extension of the target
+
+    Files smaller than the configured minimum size are not compressed, the compressed file is removed instead.
+    """
+
+    max_deps_count = 1
+    implicit_dependencies = ('_config.yml',)
+
+    def run(self):
+        path = os.path.join(self._site_root, self.dependencies[0])
+        target_path = os.path.join(self._site_root, self.target_path)
+        config = _get_compress_config(self._site_config)
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if len(data) < config['min_size']:
+            remove_output(target_path)
+            return
+
+        print("Compressing", self.target_path)
+
+        with profiler.phase('compress'):
+            if self.target_path.endswith(FORMAT_EXTENSIONS['brotli']):
+                import brotli
+
+                compressed = brotli.compress(data, quality=config['brotli_level'])
+            else:
+                # mtime=0 keeps the output the same for the same input
+                compressed = gzip.compress(data, compresslevel=config['level'], mtime=0)
+
+        write_file(target_path, compressed)
@@ -1,4 +1,8 @@
+from array import array
 from collections.abc import Sequence, Mapping
+import os
+import sys
+from types import MappingProxyType
 
 
 class Action:
@@ -7,6 +11,17 @@ class Action:
     # > 0 means: at least 1, but at most the specified number
     max_deps_count = 0
 
+    # Files (relative to the site root) which are read by run() in addition to the @dependencies,
+    # e.g. templates or the site configuration. They are only used to decide whether a rebuild is needed.
+    implicit_dependencies = ()
+
+    # Whether the outputs can be stored in the output cache: they must depend only on
+    # the target path and the contents of the inputs (see OutputCache)
+    cacheable = False
+
+    # Whether run() writes the search record of a page (see SearchObserver)
+    searchable = False
+
     def __init__(self, target_path: str, dependencies: Sequence, site_root: str, site_config: Mapping, **kwargs):
         self.__check_dependencies(dependencies)
 
@@ -32,20 +47,60 @@ class Action:
     def __format_deps(self):
         return "[" + ', '.join(["'{}'".format(d) for d in self.dependencies]) + "]"
 
+    def get_outputs(self) -> list:
+        """
+        Returns the files (relative to the site root) written by run()
+        """
+        return [self.target_path]
+
     def run(self):
         pass
 
 
+class NodeNames(Sequence):
+    """
+    Read-only sequence of node names, backed by an array of node IDs of a dependency graph
+    """
+
+    __slots__ = ('_graph', '_ids')
+
+    def __init__(self, graph, ids: array):
+        self._graph = graph
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._graph.node_name(node_id) for node_id in self._ids[index]]
+        return self._graph.node_name(self._ids[index])
+
+    def __iter__(self):
+        return map(self._graph.node_name, self._ids)
+
+    def __contains__(self, name):
+        return self._graph.has_node(name) and self._graph.node_id(name) in self._ids
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class DependencyEntry:
     """
     Represents an entry within the dependency tree
+
+    The dependencies are stored as node IDs of the graph.
     """
 
-    def __init__(self, name: str, action: (Action, None)):
+    __slots__ = ('_graph', '_name', '_action', '_need_rebuild', '_dependencies', '_phony')
+
+    def __init__(self, name: str, action: (Action, None), *, graph):
+        self._graph = graph
         self._name = name
         self._action = action
-        self._need_rebuild = True  # TODO: implement this
-        self._dependencies = list()
+        self._need_rebuild = True
+        self._dependencies = array('l')
         self._phony = False
 
     @property
@@ -70,26 +125,92 @@ class DependencyEntry:
         return bool(self._need_rebuild or self._phony)
 
     @property
-    def dependencies(self):
-        return list(self._dependencies)
+    def dependencies(self) -> NodeNames:
+        return NodeNames(self._graph, self._dependencies)
+
+    @property
+    def inputs(self):
+        """
+        All files read by the action: the dependencies and the implicit dependencies of the action
+        """
+        return list(self.dependencies) + list(self.action.implicit_dependencies)
+
+    def update_need_rebuild(self, site_root: str, build_state=None) -> bool:
+        """
+        Checks whether the target needs to be rebuilt
+
+        If the build state of the previous builds is available, the target is outdated
+        if its recorded input or output digests differ from the current ones.
+        Otherwise the target is outdated if it is missing or older than any of its inputs.
+        Inputs which do not exist are ignored, they are either generated by an other
+        entry (which must be built first) or optional, like the site configuration.
+        """
+        if self._phony:
+            self._need_rebuild = True
+        elif build_state is not None:
+            self._need_rebuild = build_state.is_outdated(self._name, self.action, self.inputs)
+        else:
+            self._need_rebuild = self.__is_outdated(site_root)
+        return self.need_rebuild
+
+    def __is_outdated(self, site_root: str) -> bool:
+        try:
+            target_mtime = os.stat(os.path.join(site_root, self._name)).st_mtime_ns
+        except FileNotFoundError:
+            return True
+
+        for dependency in self.inputs:
+            try:
+                if os.stat(os.path.join(site_root, dependency)).st_mtime_ns > target_mtime:
+                    return True
+            except FileNotFoundError:
+                continue
+
+        return False
 
     def append(self, dependency: str):
-        self._dependencies.append(dependency)
+        self._dependencies.append(self._graph.node_id(dependency))
+
+    def remove(self, dependency: str):
+        self._dependencies.remove(self._graph.node_id(dependency))
 
 
 class PhonyDependencyEntry(DependencyEntry):
-    def __init__(self, name: str):
-        super().__init__(name, None)
+    __slots__ = ()
+
+    def __init__(self, name: str, *, graph):
+        super().__init__(name, None, graph=graph)
         self._phony = True
 
 
 class Dependencies:
     """
     Represents the dependency graph
+
+    Every node (target or plain file) gets an integer ID, the names are interned.
+    The entries store the IDs of their dependencies, and the reverse edges are kept
+    as well, so the entries depending on a node can be looked up directly.
     """
 
     def __init__(self):
         self.__dependencies = dict()
+        self.__ids = dict()
+        self.__names = list()
+        self.__dependents = dict()
+
+    def node_id(self, name: str) -> int:
+        node_id = self.__ids.get(name)
+        if node_id is None:
+            name = sys.intern(name)
+            node_id = self.__ids[name] = len(self.__names)
+            self.__names.append(name)
+        return node_id
+
+    def node_name(self, node_id: int) -> str:
+        return self.__names[node_id]
+
+    def has_node(self, name: str) -> bool:
+        return name in self.__ids
 
     def add(self, key: str, dependency: str, *, action: (Action, None)=None, phony: bool=False):
         if key not in self.__dependencies:
@@ -99,18 +220,50 @@ class Dependencies:
 
         self.__dependencies[key].append(dependency)
 
+        dependency_id = self.node_id(dependency)
+        if dependency_id not in self.__dependents:
+            self.__dependents[dependency_id] = array('l')
+        self.__dependents[dependency_id].append(self.node_id(key))
+
+    def remove(self, key: str):
+        """
+        Removes the entry of @key, and the edges pointing to it
+        """
+        key_id = self.node_id(key)
+        for dependency in self.__dependencies.pop(key).dependencies:
+            dependents = self.__dependents[self.node_id(dependency)]
+            while key_id in dependents:
+                dependents.remove(key_id)
+
+        for dependent in self.dependents(key):
+            self.__dependencies[dependent].remove(key)
+        self.__dependents.pop(key_id, None)
+
+    def has_dependents(self, what) -> bool:
+        return what in self.__ids and bool(self.__dependents.get(self.__ids[what]))
+
+    def dependents(self, what) -> NodeNames:
+        """
+        Returns the keys of the entries depending directly on @what
+        """
+        return NodeNames(self, self.__dependents.get(self.__ids.get(what), array('l')))
+
     def has(self, what):
         return what in self.__dependencies
 
     def __add_dependency_entry(self, key: str, action: (Action, None), phony: bool):
+        key = self.node_name(self.node_id(key))
         if phony:
-            self.__dependencies[key] = PhonyDependencyEntry(key)
+            self.__dependencies[key] = PhonyDependencyEntry(key, graph=self)
         else:
-            self.__dependencies[key] = DependencyEntry(key, action)
+            self.__dependencies[key] = DependencyEntry(key, action, graph=self)
 
     def get_entry(self, key: str):
         return self.__dependencies[key]
 
     @property
-    def dependencies(self):
-        return dict(self.__dependencies)
+    def dependencies(self) -> Mapping:
+        """
+        Read-only view of the entries by their keys
+        """
+        return MappingProxyType(self.__dependencies)
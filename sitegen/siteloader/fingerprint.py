@@ -0,0 +1,134 @@
+from collections.abc import Mapping
+import json
+import os
+
+from sitegen.siteloader.dependency import Action
+from sitegen.siteloader.output import ensure_directory, write_file
+from sitegen.siteloader.state import file_digest
+
+THEME_ASSETS_DIRECTORY = os.path.join('templates', 'current', 'assets')
+THEME_INSTALL_NAME = 'theme'
+
+MANIFEST_TARGET = os.path.join('_install', 'asset-manifest.json')
+
+FINGERPRINT_LENGTH = 10
+DEFAULT_TYPES = ('css', 'js', 'svg', 'png', 'jpg', 'jpeg', 'gif', 'webp', 'ico', 'woff', 'woff2')
+
+_digests = dict()
+
+
+def get_asset_source_path(name: str) -> str:
+    """
+    Returns the source (relative to the site root) of an asset by its path within _install
+    """
+    parts = name.split(os.sep, 1)
+    if parts[0] == THEME_INSTALL_NAME and len(parts) == 2:
+        return os.path.join(THEME_ASSETS_DIRECTORY, parts[1])
+    return name
+
+
+def get_asset_name(path: str) -> str:
+    """
+    Returns the path of an asset within _install by its source (relative to the site root)
+    """
+    if path.startswith(THEME_ASSETS_DIRECTORY + os.sep):
+        return os.path.join(THEME_INSTALL_NAME, path[len(THEME_ASSETS_DIRECTORY) + 1:])
+    return path
+
+
+def _get_digest(site_root: str, path: str) -> (str, None):
+    full_path = os.path.join(site_root, path)
+    try:
+        st = os.stat(full_path)
+    except FileNotFoundError:
+        return None
+
+    cached = _digests.get(full_path)
+    if cached is None or cached[0] != st.st_size or cached[1] != st.st_mtime_ns:
+        cached = _digests[full_path] = (st.st_size, st.st_mtime_ns, file_digest(full_path))
+    return cached[2]
+
+
+class Fingerprints:
+    """
+    Content-hash names of the assets (css/style.css -> css/style.3f9a1c0b2d.css)
+
+    Fingerprinting is enabled by the 'fingerprint' key of _config.yml: either true, or a
+    mapping with the 'types' (file extensions) to be fingerprinted. @digest(path) returns the
+    digest of a source file, e.g. BuildState.digest(); the digests are cached per process by default.
+    """
+
+    def __init__(self, site_root: str, site_config: Mapping, digest=None):
+        self._site_root = site_root
+        self.__site_config = site_config
+        self.__digest = digest or (lambda path: _get_digest(site_root, path))
+        self.__sources = set()
+
+    @property
+    def sources(self) -> list:
+        """
+        The fingerprinted sources registered with add_source()
+        """
+        return sorted(self.__sources)
+
+    def add_source(self, path: str) -> None:
+        self.__sources.add(path)
+
+    def is_enabled(self, name: (str, None)=None) -> bool:
+        """
+        Returns whether fingerprinting is enabled, for the asset @name (its path within _install) if given
+        """
+        config = self.__site_config.get('fingerprint')
+        if not config:
+            return False
+        if name is None:
+            return True
+
+        types = config.get('types') if isinstance(config, Mapping) else None
+        return os.path.splitext(name)[1][1:] in (types or DEFAULT_TYPES)
+
+    def get_name(self, name: str) -> str:
+        """
+        Returns the fingerprinted name of the asset @name (its path within _install)
+
+        The name is returned as is if it isn't fingerprinted or its source doesn't exist.
+        """
+        if not self.is_enabled(name):
+            return name
+
+        digest = self.__digest(get_asset_source_path(name))
+        if digest is None:
+            return name
+
+        base, ext = os.path.splitext(name)
+        return '{}.{}{}'.format(base, digest[:FINGERPRINT_LENGTH], ext)
+
+    def get_url(self, name: str, root_dir: str) -> str:
+        """
+        Returns the URL of the asset @name ('/' separated path within _install) relative to @root_dir
+        """
+        name = os.path.normpath(name.lstrip('/')).replace('/', os.sep)
+        return root_dir + '/' + self.get_name(name).replace(os.sep, '/')
+
+
+class ManifestAction(Action):
+    """
+    Writes the fingerprinted names of the assets as JSON: {"css/style.css": "css/style.3f9a1c0b2d.css"}
+
+    The dependencies are the sources of the fingerprinted assets.
+    """
+
+    implicit_dependencies = ('_config.yml',)
+
+    def run(self):
+        print("Generating", self.target_path)
+
+        fingerprints = Fingerprints(self._site_root, self._site_config)
+        manifest = dict()
+        for path in self.dependencies:
+            name = get_asset_name(path)
+            manifest[name.replace(os.sep, '/')] = fingerprints.get_name(name).replace(os.sep, '/')
+
+        target_path = os.path.join(self._site_root, self.target_path)
+        ensure_directory(target_path)
+        write_file(target_path, json.dumps(manifest, indent=2, sort_keys=True) + '\n')
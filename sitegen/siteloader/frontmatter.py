@@ -0,0 +1,96 @@
+from collections.abc import Mapping
+import json
+import os
+
+from sitegen.siteloader.output import write_json
+from sitegen.siteloader.yamlloader import load_front_matter
+
+DELIMITERS = ('--', '---')
+
+
+def default_front_matter(path: str) -> str:
+    return "title: " + os.path.basename(path).rsplit('.', 1)[0]
+
+
+def read_front_matter(path: str, *, header_only: bool=False) -> tuple:
+    """
+    Reads the front matter (YAML text) and the body of a page
+
+    The front matter is between two delimiter lines ('--' or '---') at the beginning
+    of the file; only this region is read line by line, the body is read at once.
+    Without front matter the title is the file name without its extension.
+    If @header_only is true, the body is not read and None is returned instead of it.
+    """
+    with open(path, 'rt') as f:
+        first_line = f.readline()
+        delimiter = first_line.rstrip('\r\n')
+        if delimiter not in DELIMITERS:
+            return default_front_matter(path), None if header_only else first_line + f.read()
+
+        header_lines = list()
+        while True:
+            line = f.readline()
+            if not line:
+                raise Exception("Front matter is not closed with '{}'; path='{}'".format(delimiter, path))
+            if line.rstrip('\r\n') == delimiter:
+                break
+            header_lines.append(line)
+
+        return ''.join(header_lines), None if header_only else f.read()
+
+
+def read_header(path: str) -> Mapping:
+    """
+    Returns the parsed front matter of a page without reading its body
+
+    An empty dict is returned if the front matter is not a mapping, e.g. a plain string.
+    """
+    yaml_text, _ = read_front_matter(path, header_only=True)
+    header = load_front_matter(yaml_text)
+    return header if isinstance(header, Mapping) else {}
+
+
+class HeaderCache:
+    """
+    Metadata read from the front matter of files, stored in a file in _build
+
+    @read_metadata(site_root, path) returns the metadata of a file as a JSON serializable dict.
+    The front matter of a file is read again only if its size or mtime changed.
+    save() stores only the files requested with get() since load().
+    """
+
+    version = 1
+
+    def __init__(self, site_root: str, cache_file: str, read_metadata):
+        self._site_root = site_root
+        self.__path = os.path.join(site_root, cache_file)
+        self.__read_metadata = read_metadata
+        self.__cached = dict()
+        self.__entries = dict()
+
+    def load(self):
+        try:
+            with open(self.__path, 'rt') as f:
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if cache.get('version') == self.version:
+            self.__cached = cache['entries']
+
+    def save(self):
+        write_json(self.__path, {'version': self.version, 'entries': self.__entries})
+
+    def get(self, path: str) -> dict:
+        st = os.stat(os.path.join(self._site_root, path))
+        cached = self.__entries.get(path) or self.__cached.get(path)
+        if cached is None or cached[0] != st.st_size or cached[1] != st.st_mtime_ns:
+            cached = [st.st_size, st.st_mtime_ns, self.__read_metadata(self._site_root, path)]
+        self.__entries[path] = cached
+        return cached[2]
+
+    def items(self) -> list:
+        """
+        Returns the (path, metadata) pairs of the files requested since load()
+        """
+        return [(path, value[2]) for path, value in self.__entries.items()]
@@ -1,12 +1,20 @@
 from collections.abc import Sequence
 import os
 
+from sitegen.profiling import profiler
 from sitegen.siteloader.assets import CopyObserver
 
 from sitegen.siteloader.base import FileSystemObserver, DependencyCollector
+from sitegen.siteloader.compress import CompressObserver
 from sitegen.siteloader.constants import FileType
+from sitegen.siteloader.fingerprint import Fingerprints
 from sitegen.siteloader.pages import MarkdownObserver
+from sitegen.siteloader.posts import PostObserver
+from sitegen.siteloader.scanner import DirectoryScanner, IgnoreRules
+from sitegen.siteloader.search import SearchObserver
+from sitegen.siteloader.state import BuildState
 from sitegen.siteloader.theme import ThemeObserver
+from sitegen.siteloader.yamlloader import load_yaml
 
 
 class ÜberObserver(FileSystemObserver):
@@ -19,11 +27,17 @@ class ÜberObserver(FileSystemObserver):
         for observer in self.observers:
             observer.notify(directory, entry)
 
+    def finish(self):
+        for observer in self.observers:
+            observer.finish()
+
 
 class SiteWalker:
     def __init__(self, site_root):
         self._site_root = site_root
         self._observers = dict()
+        self.__scanner = DirectoryScanner(site_root)
+        self.__ignore_rules = IgnoreRules()
 
     def register(self, entry_type: FileType, observer: FileSystemObserver):
         if not entry_type in self._observers:
@@ -32,61 +46,148 @@ class SiteWalker:
         self._observers[entry_type].append(observer)
 
     def update(self):
+        self.__ignore_rules = IgnoreRules.load(self._site_root)
+        self.__scanner.load()
+
         entries = os.listdir(self._site_root)
         for entry in entries:
             if entry.startswith('_') or entry.startswith('.'):
                 continue
+            if self.__ignore_rules.is_ignored(entry, os.path.isdir(os.path.join(self._site_root, entry))):
+                continue
 
             self._process_root_entry(entry)
 
+        self.__scanner.save()
+
+        for observers in self._observers.values():
+            for observer in observers:
+                observer.finish()
+
     def _process_root_entry(self, entry: str):
         full_path = os.path.join(self._site_root, entry)
         if entry == 'source' or entry == 'pages':
             self.__process_path(full_path, FileType.page)
         elif entry == 'posts':
-            pass
+            self.__process_path(full_path, FileType.blog)
         elif entry == 'templates':
             self.__process_path(os.path.join(full_path, 'current', 'assets'), FileType.theme)
         elif os.path.isdir(full_path):
             self.__process_path(full_path, FileType.asset)
 
+    def get_file_type(self, path: str) -> (FileType, None):
+        """
+        Returns the type of a file (relative to the site root) as update() handles it
+        """
+        parts = path.split(os.sep)
+        if len(parts) < 2 or parts[0].startswith('_') or any(part.startswith('.') for part in parts):
+            return None
+        if self.__ignore_rules.is_ignored(path) or any(self.__ignore_rules.is_ignored(os.sep.join(parts[:i]), True)
+                                                       for i in range(1, len(parts))):
+            return None
+
+        if parts[0] == 'source' or parts[0] == 'pages':
+            return FileType.page
+        elif parts[0] == 'posts':
+            return FileType.blog
+        elif parts[0] == 'templates':
+            return FileType.theme if len(parts) > 3 and parts[1:3] == ['current', 'assets'] else None
+        else:
+            return FileType.asset
+
+    def notify_file(self, path: str):
+        """
+        Notifies the observers about a single file, relative to the site root
+        """
+        file_type = self.get_file_type(path)
+        if file_type not in self._observers:
+            return
+
+        directory, entry = os.path.split(path)
+        for observer in self._observers[file_type]:
+            observer.notify(directory, entry)
+        for observer in self._observers[file_type]:
+            observer.finish()
+
     def __process_path(self, path: str, observer_type: FileType):
         if observer_type not in self._observers:
             return
 
-        for root, dirs, files in os.walk(path, topdown=True):
-            for directory in dirs:
-                if directory.startswith('.'):
-                    dirs.remove(directory)
+        directory = path[len(self._site_root):].lstrip(os.sep)
+        self.__process_directory(directory, self._observers[observer_type])
 
-            directory = root[len(self._site_root):].lstrip(os.sep)
-            for entry in files:
-                if entry.startswith('.'):
-                    continue
+    def __process_directory(self, directory: str, observers: Sequence):
+        files, dirs = self.__scanner.list_directory(directory)
+
+        for entry in files:
+            if self.__ignore_rules.is_ignored(os.path.join(directory, entry)):
+                continue
 
-                for observer in self._observers[observer_type]:
-                    observer.notify(directory, entry)
+            for observer in observers:
+                observer.notify(directory, entry)
+
+        for entry in dirs:
+            path = os.path.join(directory, entry)
+            if not self.__ignore_rules.is_ignored(path, True):
+                self.__process_directory(path, observers)
 
 
 class SiteLoader:
 
-    def __init__(self, root):
+    def __init__(self, root, *, keep_intermediates: bool=False):
         self.__root = root
 
         self.dependency_collector = DependencyCollector()
-
-        self.markdown_observer = MarkdownObserver(root, self.dependency_collector)
-        self.asset_observer = CopyObserver(root, self.dependency_collector)
-        self.theme_observer = ThemeObserver(root, self.dependency_collector)
-
-        self.page_deps_observer = ÜberObserver([self.markdown_observer], root)
+        self.build_state = BuildState(root)
+        self.site_config = dict()
+        self.fingerprints = Fingerprints(root, self.site_config, digest=self.build_state.digest)
+
+        self.markdown_observer = MarkdownObserver(root, self.dependency_collector,
+                                                  keep_intermediates=keep_intermediates,
+                                                  fingerprints=self.fingerprints)
+        self.asset_observer = CopyObserver(root, self.dependency_collector, self.fingerprints)
+        self.theme_observer = ThemeObserver(root, self.dependency_collector, self.fingerprints)
+        self.post_observer = PostObserver(root, self.dependency_collector, self.site_config,
+                                          keep_intermediates=keep_intermediates,
+                                          fingerprints=self.fingerprints)
+        self.compress_observer = CompressObserver(root, self.dependency_collector, self.site_config)
+        self.dependency_collector.add_target_observer(self.compress_observer.notify_target)
+        self.search_observer = SearchObserver(root, self.dependency_collector, self.site_config)
+
+        # the search index is registered after the pages and the posts
+        self.page_deps_observer = ÜberObserver([self.markdown_observer, self.search_observer], root)
         self.asset_deps_observer = ÜberObserver([self.asset_observer], root)
         self.theme_deps_observer = ÜberObserver([self.theme_observer], root)
+        self.post_deps_observer = ÜberObserver([self.post_observer, self.search_observer], root)
 
         self.__site_walker = SiteWalker(root)
         self.__site_walker.register(FileType.page, self.page_deps_observer)
         self.__site_walker.register(FileType.asset, self.asset_deps_observer)
         self.__site_walker.register(FileType.theme, self.theme_deps_observer)
+        self.__site_walker.register(FileType.blog, self.post_deps_observer)
 
     def update(self):
-        self.__site_walker.update()
+        self.build_state.load()
+        self.load_site_config()
+        with profiler.phase('scan'):
+            self.__site_walker.update()
+
+    def load_site_config(self):
+        """
+        Loads _config.yml into site_config; the dictionary is updated in place
+        """
+        self.site_config.clear()
+
+        site_config_file = os.path.join(self.__root, '_config.yml')
+        if os.path.exists(site_config_file):
+            with open(site_config_file, 'rt') as f, profiler.phase('yaml'):
+                self.site_config.update(load_yaml(f) or {})
+
+    def get_file_type(self, path: str) -> (FileType, None):
+        return self.__site_walker.get_file_type(path)
+
+    def add_file(self, path: str):
+        """
+        Adds the dependencies of a new file (relative to the site root) to the dependency graph
+        """
+        self.__site_walker.notify_file(path)
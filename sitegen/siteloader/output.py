@@ -0,0 +1,131 @@
+import json
+import os
+
+_existing_directories = set()
+
+
+def ensure_directory(path: str) -> None:
+    """
+    Creates the directory of @path if needed
+
+    The directories known to exist are remembered, so a directory is checked
+    only once per process instead of once per file. A directory removed later
+    must be forgotten (see forget_directory() and recreate_directory()).
+    """
+    directory = os.path.dirname(path)
+    if directory in _existing_directories:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _existing_directories.add(directory)
+
+
+def forget_directory(directory: str) -> None:
+    """
+    Forgets that @directory and its subdirectories exist, e.g. after removing it
+    """
+    prefix = os.path.join(directory, '')
+    for known in [known for known in _existing_directories if known == directory or known.startswith(prefix)]:
+        _existing_directories.discard(known)
+
+
+def recreate_directory(path: str) -> None:
+    """
+    Creates the directory of @path again, if it was removed since ensure_directory() (e.g. in watch mode)
+    """
+    forget_directory(os.path.dirname(path))
+    ensure_directory(path)
+
+
+_changed_outputs = list()
+_removed_outputs = list()
+
+TMP_SUFFIX = '.sitegen-tmp'
+
+
+def write_file(path: str, contents: (str, bytes), *, record: bool=True) -> bool:
+    """
+    Writes @contents into @path unless the file has the same contents, returns whether it was written
+
+    The file is left untouched (including its mtime) if the size and the contents are the same,
+    otherwise the contents are written into a temporary file next to it, which is renamed to @path,
+    so the file is never seen half-written. The written files are recorded (see get_changed_outputs()),
+    unless @record is false, e.g. for the state files in _build.
+    """
+    if isinstance(contents, str):
+        contents = contents.encode('utf-8')
+
+    if _has_contents(path, contents):
+        return False
+
+    tmp_path = path + TMP_SUFFIX
+    try:
+        f = open(tmp_path, 'wb')
+    except FileNotFoundError:
+        recreate_directory(path)
+        f = open(tmp_path, 'wb')
+    with f:
+        f.write(contents)
+    os.replace(tmp_path, path)
+    if record:
+        record_changed_output(path)
+    return True
+
+
+def write_json(path: str, data, *, sort_keys: bool=False) -> bool:
+    """
+    Writes @data as compact JSON into a state file (see write_file()), creating its directory if needed
+    """
+    ensure_directory(path)
+    return write_file(path, json.dumps(data, separators=(',', ':'), sort_keys=sort_keys), record=False)
+
+
+def _has_contents(path: str, contents: bytes) -> bool:
+    try:
+        if os.stat(path).st_size != len(contents):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == contents
+    except FileNotFoundError:
+        return False
+
+
+def remove_output(path: str) -> bool:
+    """
+    Removes the output @path if it exists, returns whether it was removed
+
+    The removed files are recorded (see get_removed_outputs()).
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    _removed_outputs.append(path)
+    return True
+
+
+def record_changed_output(path: str) -> None:
+    _changed_outputs.append(path)
+
+
+def add_changed_outputs(paths, removed_paths=()) -> None:
+    """
+    Adds the outputs changed and removed by another process, e.g. by a worker of the parallel builder
+    """
+    _changed_outputs.extend(paths)
+    _removed_outputs.extend(removed_paths)
+
+
+def get_changed_outputs() -> list:
+    return list(_changed_outputs)
+
+
+def get_removed_outputs() -> list:
+    return list(_removed_outputs)
+
+
+def reset_changed_outputs() -> None:
+    """
+    Forgets the changed and the removed outputs
+    """
+    del _changed_outputs[:]
+    del _removed_outputs[:]
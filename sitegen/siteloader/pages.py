@@ -1,12 +1,48 @@
+from collections.abc import Mapping, Sequence
+import json
 import os
 
-import markdown
-
-from sitegen.siteloader.base import FinalHtmlAction, FSDependencyObserver
+from sitegen.siteloader.base import FinalHtmlAction, FSDependencyObserver, TemplateDependencies
 from sitegen.siteloader.dependency import Action
+from sitegen.siteloader.frontmatter import HeaderCache, read_front_matter, read_header
+from sitegen.siteloader.yamlloader import load_front_matter
+from sitegen.siteloader.output import ensure_directory, write_file
+from sitegen.siteloader.search import get_record_outputs, is_search_enabled, write_search_record
+from sitegen.profiling import profiler
+
+PAGE_INDEX_FILE = os.path.join('_build', '.sitegen-pages')
+
+
+def read_page_metadata(site_root: str, path: str) -> dict:
+    """
+    Reads the layout of a page from its front matter
+    """
+    layout = read_header(os.path.join(site_root, path)).get('layout')
+    return {} if layout is None else {'layout': str(layout)}
 
 
 class MarkdownObserver(FSDependencyObserver):
+    """
+    Registers the pages; each page depends on its source and on the templates of its layout
+
+    The layout is selected by the 'layout' key of the front matter ('default' if missing),
+    the front matter is read again only if the file changed (see HeaderCache).
+    """
+
+    # Directory of the generated pages within _install (and _build)
+    install_directory = ()
+
+    def __init__(self, site_root: str, dependency_collector, *, keep_intermediates: bool=False,
+                 fingerprints=None):
+        super().__init__(site_root, dependency_collector)
+        self.__keep_intermediates = keep_intermediates
+        self._headers = self._create_header_cache()
+        self._headers.load()
+        self._templates = TemplateDependencies(site_root, fingerprints)
+
+    def _create_header_cache(self) -> HeaderCache:
+        return HeaderCache(self._site_root, PAGE_INDEX_FILE, read_page_metadata)
+
     def notify(self, directory: str, entry: str):
         is_md = entry.endswith('.md')
         is_html = entry.endswith('.html')
@@ -18,50 +54,60 @@ class MarkdownObserver(FSDependencyObserver):
 
             sub_path_items = name_path.split(os.path.sep)[1:]
 
-            build_target_path = os.sep.join(['_build'] + sub_path_items) + '.middle'
+            build_target_path = os.sep.join(['_build', *self.install_directory] + sub_path_items) + '.middle'
             yaml_target_path = build_target_path + '.yml'
-            install_target_path = os.sep.join(['_install'] + sub_path_items) + '.html'
+            install_target_path = os.sep.join(['_install', *self.install_directory] + sub_path_items) + '.html'
 
-            action_class = MarkdownAction if is_md else HtmlAction
+            templates = self._templates.get(self._headers.get(path).get('layout'))
 
-            self._dependency_collector.add_site_dependency([install_target_path])
-            self._dependency_collector.add_dependency(install_target_path,
-                                                      [build_target_path, yaml_target_path],
-                                                      FinalHtmlAction)
-            self._dependency_collector.add_dependency(build_target_path, [path], action_class)
+            # a page is notified again if it changed in watch mode, as its layout may have changed
+            collector = self._dependency_collector
+            for target in (install_target_path, build_target_path):
+                if collector.graph.has(target):
+                    collector.remove(target)
 
+            collector.add_site_dependency([install_target_path])
 
-class _PageAction(Action):
-    max_deps_count = 1
+            if self.__keep_intermediates:
+                action_class = MarkdownAction if is_md else HtmlAction
+                collector.add_dependency(install_target_path, [build_target_path, yaml_target_path] + templates,
+                                         FinalHtmlAction)
+                collector.add_dependency(build_target_path, [path], action_class)
+            else:
+                action_class = DirectMarkdownAction if is_md else DirectHtmlAction
+                collector.add_dependency(install_target_path, [path] + templates, action_class)
 
-    def __get_input_text(self, path: str):
-        with open(path, 'rt') as f:
-            input_text = f.read()
+    def finish(self):
+        self._headers.save()
 
-        lines = input_text.splitlines()
 
-        if lines[0] == '--':
-            end = lines[1:].index('--') + 1
+class _PageAction(Action):
+    max_deps_count = 1
+    cacheable = True
+    searchable = True
 
-            yaml_text = '\n'.join(lines[1:end])
-            input_text = '\n'.join(lines[(end + 2):])
-        else:
-            yaml_text = "title: " + os.path.basename(path).rsplit('.', 1)[0]
+    def get_outputs(self) -> list:
+        return [self.target_path, self.target_path + '.yml'] + get_record_outputs(self.target_path, self._site_config)
 
+    def _get_input_text(self, path: str):
+        yaml_text, input_text = read_front_matter(path)
         return input_text, yaml_text
 
     def run(self):
         path, target_path, yaml_target_path = self.__get_full_paths()
-        if not os.path.exists(os.path.dirname(target_path)):
-            os.makedirs(os.path.dirname(target_path))
+        ensure_directory(target_path)
 
         print("Compiling", self.target_path)
 
-        input_text, yaml_text = self.__get_input_text(path)
+        input_text, yaml_text = self._get_input_text(path)
 
         output_text = self._format_text(input_text)
 
         self.__write_output_files(output_text, target_path, yaml_target_path, yaml_text)
+        if is_search_enabled(self._site_config):
+            with profiler.phase('yaml'):
+                yaml_object = load_front_matter(yaml_text)
+            self._write_search_record(output_text, yaml_object)
 
     def __get_full_paths(self):
         path = os.path.join(self._site_root, self.dependencies[0])
@@ -72,18 +118,110 @@ class _PageAction(Action):
     def _format_text(self, input_text: str):
         raise NotImplementedError("Cannot generate output text")
 
+    def _write_search_record(self, output_text: str, yaml_object) -> None:
+        if not is_search_enabled(self._site_config):
+            return
+        title = yaml_object.get('title') if isinstance(yaml_object, Mapping) else None
+        with profiler.phase('search'):
+            write_search_record(self._site_root, self.target_path, title, output_text)
+
     def __write_output_files(self, output_text, target_path, yaml_target_path, yaml_text):
-        with open(target_path, 'wt') as f:
-            f.write(output_text)
-        with open(yaml_target_path, 'wt') as f:
-            f.write(yaml_text)
+        with profiler.phase('write'):
+            write_file(target_path, output_text)
+            write_file(yaml_target_path, yaml_text)
+
+
+class MarkdownConverter:
+    """
+    Reusable Markdown converter
+
+    The Markdown object and its extensions are created once, and the object is
+    reset between the documents. Use get() to have one converter per process
+    for a given configuration.
+
+    The extensions can be set in _config.yml:
+
+        markdown:
+          extensions: [toc, tables]
+          extension_configs:
+            toc:
+              permalink: true
+    """
+
+    __converters = dict()
+
+    def __init__(self, extensions: Sequence=(), extension_configs: (Mapping, None)=None):
+        # imported here, as it's not needed if no page is compiled
+        import markdown
+
+        self.__markdown = markdown.Markdown(extensions=list(extensions),
+                                            extension_configs=dict(extension_configs or {}),
+                                            output_format='html5')
+
+    @classmethod
+    def get(cls, site_config: Mapping):
+        config = site_config.get('markdown') or {}
+        extensions = config.get('extensions') or ()
+        extension_configs = config.get('extension_configs') or {}
+
+        key = json.dumps([extensions, extension_configs], sort_keys=True)
+        if key not in cls.__converters:
+            cls.__converters[key] = cls(extensions, extension_configs)
+        return cls.__converters[key]
+
+    def convert(self, text: str) -> str:
+        with profiler.phase('markdown'):
+            return self.__markdown.reset().convert(text)
+
+    def convert_all(self, texts: Sequence) -> list:
+        return [self.convert(text) for text in texts]
 
 
 class MarkdownAction(_PageAction):
+    implicit_dependencies = ('_config.yml',)
+
     def _format_text(self, input_text: str):
-        return markdown.markdown(input_text, output_format='html5')
+        return MarkdownConverter.get(self._site_config).convert(input_text)
 
 
 class HtmlAction(_PageAction):
     def _format_text(self, input_text: str):
         return input_text
+
+
+class _DirectPageAction(_PageAction):
+    """
+    Compiles the page and renders the final HTML file in one step
+
+    The output of the page and its front matter are passed to the template in memory,
+    the intermediate files in _build are not written. The dependencies are the page,
+    then the template files of its layout.
+    """
+
+    max_deps_count = 0
+    implicit_dependencies = FinalHtmlAction.implicit_dependencies
+
+    def get_outputs(self) -> list:
+        return [self.target_path] + get_record_outputs(self.target_path, self._site_config)
+
+    def run(self):
+        path = os.path.join(self._site_root, self.dependencies[0])
+
+        print("Compiling", self.dependencies[0])
+
+        input_text, yaml_text = self._get_input_text(path)
+        output_text = self._format_text(input_text)
+
+        final_action = FinalHtmlAction(self.target_path, self.dependencies, self._site_root, self._site_config)
+        with profiler.phase('yaml'):
+            yaml_object = load_front_matter(yaml_text)
+        final_action.render(output_text, yaml_object)
+        self._write_search_record(output_text, yaml_object)
+
+
+class DirectMarkdownAction(_DirectPageAction, MarkdownAction):
+    pass
+
+
+class DirectHtmlAction(_DirectPageAction, HtmlAction):
+    pass
@@ -0,0 +1,321 @@
+from collections.abc import Mapping, Sequence
+import datetime
+from html import escape
+import json
+import os
+import re
+
+from sitegen.siteloader.base import FinalHtmlAction
+from sitegen.siteloader.dependency import Action
+from sitegen.siteloader.frontmatter import HeaderCache, read_header
+from sitegen.siteloader.output import ensure_directory, write_file
+from sitegen.siteloader.pages import MarkdownObserver
+
+POST_INDEX_FILE = os.path.join('_build', '.sitegen-posts')
+POSTS_DIRECTORY = 'posts'
+
+DEFAULT_PER_PAGE = 10
+DEFAULT_FEED_SIZE = 20
+
+_DATE_PREFIX = re.compile(r'^(\d{4}-\d{2}-\d{2})-')
+_TAG_SLUG = re.compile(r'[^\w-]+')
+
+
+def _get_posts_config(site_config: Mapping) -> tuple:
+    config = site_config.get('posts') or {}
+    return config.get('per_page', DEFAULT_PER_PAGE), config.get('feed_size', DEFAULT_FEED_SIZE)
+
+
+def tag_slug(tag: str) -> str:
+    return _TAG_SLUG.sub('-', tag).strip('-').lower() or 'tag'
+
+
+def post_target_path(path: str) -> str:
+    """
+    Returns the _install path of the page of a post, @path is relative to the site root
+    """
+    return os.sep.join(['_install', POSTS_DIRECTORY] + os.path.splitext(path)[0].split(os.sep)[1:]) + '.html'
+
+
+def post_metadata_path(path: str) -> str:
+    """
+    Returns the _build path of the metadata file of a post (see PostMetadataAction), @path is relative to the site root
+    """
+    return os.sep.join(['_build', POSTS_DIRECTORY] + path.split(os.sep)[1:]) + '.meta.json'
+
+
+def read_post_metadata(site_root: str, path: str) -> dict:
+    """
+    Reads the title, date, tags and layout of a post from its front matter, without reading its body
+
+    The date is taken from the front matter, or from a 'YYYY-MM-DD-' prefix of the file name.
+    """
+    header = read_header(os.path.join(site_root, path))
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    date = header.get('date')
+    if date is None:
+        match = _DATE_PREFIX.match(name)
+        date = match.group(1) if match else '1970-01-01'
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        date = date.isoformat()
+
+    tags = header.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split()
+
+    metadata = {
+        'title': str(header.get('title', name)),
+        'date': str(date),
+        'tags': [str(tag) for tag in tags],
+    }
+    if header.get('layout') is not None:
+        metadata['layout'] = str(header['layout'])
+    return metadata
+
+
+class PostIndex(HeaderCache):
+    """
+    Metadata of all posts, stored in _build/.sitegen-posts
+    """
+
+    version = 2
+
+    def __init__(self, site_root: str):
+        super().__init__(site_root, POST_INDEX_FILE, read_post_metadata)
+
+    def get_posts(self) -> list:
+        """
+        Returns (path, metadata) pairs of the posts, the newest first
+        """
+        return sorted(self.items(), key=lambda post: (post[1]['date'], post[0]), reverse=True)
+
+
+class PostObserver(MarkdownObserver):
+    """
+    Registers the pages of the posts, and the listings: the index, the archive, the tag pages and the feed
+
+    Each listing depends only on the metadata of the posts it shows, so a new post rebuilds
+    only the index, the last archive page, the pages of its tags and the feed, and editing
+    the body of a post rebuilds none of them. The archive is paginated from the oldest post,
+    so the existing pages don't change when a new post is added.
+    """
+
+    install_directory = (POSTS_DIRECTORY,)
+
+    def __init__(self, site_root: str, dependency_collector, site_config: Mapping, *,
+                 keep_intermediates: bool=False, fingerprints=None):
+        super().__init__(site_root, dependency_collector, keep_intermediates=keep_intermediates,
+                         fingerprints=fingerprints)
+        self.__site_config = site_config
+        self.__listings = list()
+
+    def _create_header_cache(self) -> HeaderCache:
+        return PostIndex(self._site_root)
+
+    def notify(self, directory: str, entry: str):
+        super().notify(directory, entry)
+        if not entry.endswith('.md') and not entry.endswith('.html'):
+            return
+
+        path = os.path.join(directory, entry)
+        metadata_path = post_metadata_path(path)
+        if not self._dependency_collector.graph.has(metadata_path):
+            self._dependency_collector.add_dependency(metadata_path, [path], PostMetadataAction)
+
+    def finish(self):
+        super().finish()
+
+        collector = self._dependency_collector
+        for target in self.__listings:
+            if collector.graph.has(target):
+                collector.remove(target)
+        self.__listings = list()
+
+        posts = [path for path, metadata in self._headers.get_posts()]
+        if not posts:
+            return
+
+        per_page, feed_size = _get_posts_config(self.__site_config)
+        base = os.path.join('_install', POSTS_DIRECTORY)
+
+        self.__add_listing(os.path.join(base, 'index.html'), posts[:per_page], PostIndexAction)
+        self.__add_listing(os.path.join(base, 'atom.xml'), posts[:feed_size], AtomFeedAction)
+
+        oldest_first = list(reversed(posts))
+        for start in range(0, len(oldest_first), per_page):
+            # the first post of the next page is a dependency as well, for the link to that page
+            page_posts = oldest_first[start:start + per_page + 1]
+            target = os.path.join(base, 'archive', 'page{}.html'.format(start // per_page + 1))
+            self.__add_listing(target, page_posts, PostArchiveAction)
+
+        # tags differing only in case or punctuation share the page
+        tags = dict()
+        for path, metadata in self._headers.get_posts():
+            for slug in sorted(set(tag_slug(tag) for tag in metadata['tags'])):
+                tags.setdefault(slug, list()).append(path)
+        for slug, tag_posts in sorted(tags.items()):
+            self.__add_listing(os.path.join(base, 'tags', slug + '.html'), tag_posts, PostTagAction)
+
+    def __add_listing(self, target: str, posts: Sequence, action) -> None:
+        templates = self._templates.get(None) if issubclass(action, FinalHtmlAction) else []
+        metadata_paths = [post_metadata_path(path) for path in posts]
+        self._dependency_collector.add_site_dependency([target])
+        self._dependency_collector.add_dependency(target, metadata_paths + templates, action)
+        self.__listings.append(target)
+
+
+class PostMetadataAction(Action):
+    """
+    Writes the metadata of a post (see read_post_metadata()) as JSON, the listings depend on it
+
+    The file is written only if the metadata changed, so the listings are not rebuilt
+    if only the body of a post changed.
+    """
+
+    max_deps_count = 1
+
+    def run(self):
+        path = self.dependencies[0]
+        metadata = dict(read_post_metadata(self._site_root, path), path=path)
+
+        target_path = os.path.join(self._site_root, self.target_path)
+        ensure_directory(target_path)
+        write_file(target_path, json.dumps(metadata, sort_keys=True))
+
+
+def read_post_metadata_file(site_root: str, metadata_path: str) -> dict:
+    with open(os.path.join(site_root, metadata_path), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _is_post_metadata_path(path: str) -> bool:
+    return path.startswith(os.path.join('_build', POSTS_DIRECTORY, '')) and path.endswith('.meta.json')
+
+
+class _PostListAction(FinalHtmlAction):
+    """
+    Renders a list of posts with the default template
+
+    The posts are available in the template as 'page.posts' (title, date, tags, url),
+    the generated list as 'content'. The dependencies are the metadata files of the posts
+    (see PostMetadataAction), then the template files.
+    """
+
+    max_deps_count = 0
+
+    @property
+    def _post_paths(self) -> list:
+        return [path for path in self.dependencies if _is_post_metadata_path(path)]
+
+    def run(self):
+        posts = self._get_posts()
+        links = self._get_links()
+        page = {
+            'title': self._get_title(),
+            'posts': posts,
+        }
+        page.update(links)
+
+        items = ['<li><a href="{url}">{title}</a> <time>{date}</time></li>'.format(
+            url=escape(post['url']), title=escape(post['title']), date=escape(post['date']))
+            for post in posts]
+        content = '<h1>{}</h1>\n<ul class="posts">\n{}\n</ul>'.format(escape(page['title']), '\n'.join(items))
+        content += ''.join('\n<a rel="{0}" href="{1}">{0}</a>'.format(rel, escape(url))
+                           for rel, url in sorted(links.items()))
+
+        self.render(content, page)
+
+    def _get_posts(self, paths: (Sequence, None)=None) -> list:
+        posts = list()
+        directory = os.path.dirname(self.target_path)
+        for metadata_path in self._post_paths if paths is None else paths:
+            post = read_post_metadata_file(self._site_root, metadata_path)
+            post['url'] = os.path.relpath(post_target_path(post.pop('path')), directory).replace(os.sep, '/')
+            posts.append(post)
+        return sorted(posts, key=lambda post: post['date'], reverse=True)
+
+    def _get_title(self) -> str:
+        return 'Posts'
+
+    def _get_links(self) -> dict:
+        return {}
+
+
+class PostIndexAction(_PostListAction):
+    pass
+
+
+class PostTagAction(_PostListAction):
+    def _get_title(self) -> str:
+        return 'Posts tagged {}'.format(os.path.splitext(os.path.basename(self.target_path))[0])
+
+
+class PostArchiveAction(_PostListAction):
+    def __get_number(self) -> int:
+        return int(os.path.basename(self.target_path)[len('page'):-len('.html')])
+
+    def _get_posts(self, paths: (Sequence, None)=None) -> list:
+        per_page, _ = _get_posts_config(self._site_config)
+        return super()._get_posts(self._post_paths[:per_page])
+
+    def _get_title(self) -> str:
+        return 'Archive, page {}'.format(self.__get_number())
+
+    def _get_links(self) -> dict:
+        per_page, _ = _get_posts_config(self._site_config)
+        number = self.__get_number()
+        links = dict()
+        if number > 1:
+            links['previous'] = 'page{}.html'.format(number - 1)
+        if len(self._post_paths) > per_page:
+            links['next'] = 'page{}.html'.format(number + 1)
+        return links
+
+
+class AtomFeedAction(Action):
+    """
+    Writes an Atom feed of the posts; the absolute URLs need the 'url' key in _config.yml
+
+    The dependencies are the metadata files of the posts (see PostMetadataAction).
+    """
+
+    implicit_dependencies = ('_config.yml',)
+
+    def run(self):
+        print("Generating", self.target_path)
+
+        base_url = str(self._site_config.get('url', '')).rstrip('/')
+        feed_url = base_url + '/' + self.target_path[len('_install') + 1:].replace(os.sep, '/')
+
+        posts = [read_post_metadata_file(self._site_root, path) for path in self.dependencies]
+        posts.sort(key=lambda post: post['date'], reverse=True)
+
+        lines = [
+            '<?xml version="1.0" encoding="utf-8"?>',
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            '<title>{}</title>'.format(escape(str(self._site_config.get('name', 'Posts')))),
+            '<id>{}</id>'.format(escape(feed_url)),
+            '<link rel="self" href="{}"/>'.format(escape(feed_url)),
+            '<updated>{}</updated>'.format(self.__format_date(posts[0]['date'])),
+        ]
+        for post in posts:
+            url = base_url + '/' + post_target_path(post['path'])[len('_install') + 1:].replace(os.sep, '/')
+            lines.extend([
+                '<entry>',
+                '<title>{}</title>'.format(escape(post['title'])),
+                '<id>{}</id>'.format(escape(url)),
+                '<link href="{}"/>'.format(escape(url)),
+                '<updated>{}</updated>'.format(self.__format_date(post['date'])),
+                ''.join('<category term="{}"/>'.format(escape(tag)) for tag in post['tags']),
+                '</entry>',
+            ])
+        lines.append('</feed>')
+
+        target_path = os.path.join(self._site_root, self.target_path)
+        ensure_directory(target_path)
+        write_file(target_path, '\n'.join(lines) + '\n')
+
+    @staticmethod
+    def __format_date(date: str) -> str:
+        return date if 'T' in date else date + 'T00:00:00Z'
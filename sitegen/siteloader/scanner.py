@@ -0,0 +1,126 @@
+import fnmatch
+import json
+import os
+import time
+
+from sitegen.siteloader.output import write_json
+
+SNAPSHOT_FILE = os.path.join('_build', '.sitegen-snapshot')
+IGNORE_FILE = '.sitegenignore'
+
+
+class IgnoreRules:
+    """
+    Glob patterns of the files and directories to be skipped, read from .sitegenignore
+
+    Each non-empty line which doesn't start with '#' is a pattern. Patterns containing
+    a '/' are matched against the path relative to the site root, the others against
+    the name of the file or directory. Patterns ending with '/' only match directories.
+    """
+
+    def __init__(self, patterns=()):
+        self.__patterns = list()
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            directory_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            self.__patterns.append((pattern.lstrip('/'), '/' in pattern, directory_only))
+
+    @classmethod
+    def load(cls, site_root: str):
+        try:
+            with open(os.path.join(site_root, IGNORE_FILE), 'rt') as f:
+                return cls(f.read().splitlines())
+        except FileNotFoundError:
+            return cls()
+
+    def is_ignored(self, path: str, is_dir: bool=False) -> bool:
+        if not self.__patterns:
+            return False
+
+        path = path.replace(os.sep, '/')
+        name = path.rsplit('/', 1)[-1]
+        for pattern, match_path, directory_only in self.__patterns:
+            if directory_only and not is_dir:
+                continue
+            if fnmatch.fnmatchcase(path if match_path else name, pattern):
+                return True
+        return False
+
+
+class DirectoryScanner:
+    """
+    Lists directories with os.scandir, using a snapshot of the previous scan
+
+    The snapshot stores the mtime and the entries of each directory. As adding,
+    removing or renaming an entry changes the mtime of its directory, the entries
+    of a directory with unchanged mtime are taken from the snapshot, and only its
+    subdirectories need to be checked.
+    Entries with a leading '.' are always skipped.
+    """
+
+    version = 1
+
+    # directories modified this recently are not trusted in the snapshot,
+    # as further changes within the mtime resolution would be missed
+    racy_period_ns = 2 * 10 ** 9
+
+    def __init__(self, site_root: str):
+        self._site_root = site_root
+        self.__path = os.path.join(site_root, SNAPSHOT_FILE)
+        self.__snapshot = dict()
+        self.__new_snapshot = dict()
+
+    def load(self) -> None:
+        try:
+            with open(self.__path, 'rt') as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if snapshot.get('version') == self.version:
+            self.__snapshot = snapshot['directories']
+
+    def save(self) -> None:
+        write_json(self.__path, {'version': self.version, 'directories': self.__new_snapshot})
+
+        self.__snapshot = self.__new_snapshot
+        self.__new_snapshot = dict()
+
+    def list_directory(self, directory: str) -> tuple:
+        """
+        Returns the names of the files and the subdirectories of @directory (relative to the site root)
+        """
+        try:
+            mtime = os.stat(os.path.join(self._site_root, directory)).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return (), ()
+
+        cached = self.__snapshot.get(directory)
+        if cached is not None and cached[0] == mtime:
+            files, dirs = cached[1], cached[2]
+        else:
+            files, dirs = self.__scan(directory)
+
+        if mtime < time.time_ns() - self.racy_period_ns:
+            self.__new_snapshot[directory] = [mtime, files, dirs]
+
+        return files, dirs
+
+    def __scan(self, directory: str) -> tuple:
+        files = list()
+        dirs = list()
+        with os.scandir(os.path.join(self._site_root, directory)) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+
+        files.sort()
+        dirs.sort()
+        return files, dirs
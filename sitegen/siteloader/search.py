@@ -0,0 +1,237 @@
+from collections import Counter
+from collections.abc import Mapping
+from html.parser import HTMLParser
+import json
+import os
+import re
+
+from sitegen.siteloader.base import FSDependencyObserver
+from sitegen.siteloader.dependency import Action
+from sitegen.siteloader.output import ensure_directory, write_file
+
+INSTALL_DIRECTORY = os.path.join('_install', 'search')
+DOCUMENTS_TARGET = os.path.join(INSTALL_DIRECTORY, 'documents.json')
+
+# the records of the pages; the leading '.' keeps them when _build is pruned
+RECORD_DIRECTORY = os.path.join('_build', '.search')
+
+# Changing the format of the records or of the index needs a new version
+SEARCH_VERSION = 1
+
+DEFAULT_SHARDS = 8
+EXCERPT_LENGTH = 160
+
+_TERM_RE = re.compile(r'\w{2,}')
+_SKIPPED_TAGS = ('script', 'style')
+
+_records = dict()
+
+
+def is_search_enabled(site_config: Mapping) -> bool:
+    return bool(site_config.get('search'))
+
+
+def get_shard_count(site_config: Mapping) -> int:
+    config = site_config.get('search')
+    shards = config.get('shards') if isinstance(config, Mapping) else None
+    return max(1, int(shards or DEFAULT_SHARDS))
+
+
+def get_record_path(target_path: str) -> str:
+    """
+    Returns the path of the search record written by the action of a page target
+    """
+    return os.path.join(RECORD_DIRECTORY, target_path.split(os.sep, 1)[1] + '.json')
+
+
+def get_record_outputs(target_path: str, site_config: Mapping) -> list:
+    return [get_record_path(target_path)] if is_search_enabled(site_config) else []
+
+
+def get_page_url(target_path: str) -> str:
+    """
+    Returns the URL (relative to the site root) of the page of a target in _install or _build
+    """
+    name = target_path.split(os.sep, 1)[1]
+    if name.endswith('.middle'):
+        name = name[:-len('.middle')] + '.html'
+    return name.replace(os.sep, '/')
+
+
+def get_term_shard(term: str, shards: int) -> int:
+    """
+    Returns the shard of a term: the 32-bit FNV-1a hash of its UTF-8 bytes modulo the number of shards
+    """
+    value = 0x811c9dc5
+    for byte in term.encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value % shards
+
+
+def get_terms(text: str) -> list:
+    """
+    Returns the terms of a text: its lower case words of at least two characters
+    """
+    return _TERM_RE.findall(text.lower())
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.__parts = list()
+        self.__skipped = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self.__skipped += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS and self.__skipped:
+            self.__skipped -= 1
+
+    def handle_data(self, data):
+        if not self.__skipped:
+            self.__parts.append(data)
+
+    @property
+    def text(self) -> str:
+        return ' '.join(''.join(self.__parts).split())
+
+
+def get_plain_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text
+
+
+def write_search_record(site_root: str, target_path: str, title: (str, None), html: str) -> None:
+    """
+    Writes the search record of a page: its title, an excerpt and the number of occurrences of its terms
+    """
+    text = get_plain_text(html)
+    record = {
+        'version': SEARCH_VERSION,
+        'title': '' if title is None else str(title),
+        'excerpt': text[:EXCERPT_LENGTH],
+        'terms': dict(sorted(Counter(get_terms(text)).items())),
+    }
+
+    path = os.path.join(site_root, get_record_path(target_path))
+    ensure_directory(path)
+    write_file(path, json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+
+def _read_record(site_root: str, target_path: str) -> (dict, None):
+    path = os.path.join(site_root, get_record_path(target_path))
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    cached = _records.get(path)
+    if cached is None or cached[0] != st.st_size or cached[1] != st.st_mtime_ns:
+        with open(path, 'rt', encoding='utf-8') as f:
+            record = json.load(f)
+        cached = _records[path] = (st.st_size, st.st_mtime_ns, record)
+
+    return cached[2] if cached[2].get('version') == SEARCH_VERSION else None
+
+
+class SearchObserver(FSDependencyObserver):
+    """
+    Registers the search index in _install/search, if the 'search' key is in _config.yml
+
+    The actions of the pages write a record of each page into _build/.search when they
+    run, so only the changed pages are tokenized; the index is merged from these records.
+    documents.json lists the pages, the terms are split into terms-N.json shards by
+    their hash (see get_term_shard()), so the browser loads only the shards of the query.
+    """
+
+    def __init__(self, site_root: str, dependency_collector, site_config: Mapping):
+        super().__init__(site_root, dependency_collector)
+        self.__site_config = site_config
+        self.__targets = list()
+
+    def finish(self):
+        collector = self._dependency_collector
+        for target in self.__targets:
+            if collector.graph.has(target):
+                collector.remove(target)
+        self.__targets = list()
+
+        if not is_search_enabled(self.__site_config):
+            return
+
+        pages = sorted(name for name, entry in collector.graph.dependencies.items()
+                       if not entry.phony and entry.action.searchable)
+        if not pages:
+            return
+
+        self.__add_target(DOCUMENTS_TARGET, pages, SearchDocumentsAction)
+        for shard in range(get_shard_count(self.__site_config)):
+            target = os.path.join(INSTALL_DIRECTORY, 'terms-{}.json'.format(shard))
+            self.__add_target(target, pages, SearchTermsAction)
+
+    def __add_target(self, target: str, pages: list, action) -> None:
+        self._dependency_collector.add_site_dependency([target])
+        self._dependency_collector.add_dependency(target, pages, action)
+        self.__targets.append(target)
+
+
+class _SearchIndexAction(Action):
+    """
+    Writes a part of the search index from the records of the pages
+
+    The dependencies are the targets of the pages, their position is the ID of the page in the index.
+    """
+
+    implicit_dependencies = ('_config.yml',)
+
+    def run(self):
+        print("Generating", self.target_path)
+
+        records = [_read_record(self._site_root, page) for page in self.dependencies]
+
+        target_path = os.path.join(self._site_root, self.target_path)
+        ensure_directory(target_path)
+        write_file(target_path, json.dumps(self._get_index(records), ensure_ascii=False, separators=(',', ':')))
+
+    def _get_index(self, records: list):
+        raise NotImplementedError("Cannot generate search index")
+
+
+class SearchDocumentsAction(_SearchIndexAction):
+    """
+    Writes the pages: {"version": 1, "shards": 8, "documents": [[url, title, excerpt], ...]}
+    """
+
+    def _get_index(self, records: list):
+        documents = list()
+        for page, record in zip(self.dependencies, records):
+            record = record or {}
+            documents.append([get_page_url(page), record.get('title', ''), record.get('excerpt', '')])
+
+        return {
+            'version': SEARCH_VERSION,
+            'shards': get_shard_count(self._site_config),
+            'documents': documents,
+        }
+
+
+class SearchTermsAction(_SearchIndexAction):
+    """
+    Writes the terms of a shard: {"term": [document ID, count, document ID, count, ...], ...}
+    """
+
+    def _get_index(self, records: list):
+        shards = get_shard_count(self._site_config)
+        shard = int(os.path.basename(self.target_path)[len('terms-'):-len('.json')])
+
+        terms = dict()
+        for document, record in enumerate(records):
+            for term, count in (record or {}).get('terms', {}).items():
+                if get_term_shard(term, shards) == shard:
+                    terms.setdefault(term, list()).extend([document, count])
+
+        return dict(sorted(terms.items()))
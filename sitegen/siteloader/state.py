@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+
+from sitegen.siteloader.output import write_json
+
+STATE_FILE = os.path.join('_build', '.sitegen-state')
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def action_name(action) -> str:
+    return '{}.{}'.format(action.__module__, action.__qualname__)
+
+
+class BuildState:
+    """
+    Persistent record of the previous builds, stored in _build/.sitegen-state
+
+    For every built target it contains the action class, the digests of the inputs
+    (including the implicit ones, like the template and the site configuration) and
+    the digest of the output. The digests of the files are cached together with their
+    size and mtime, so a file is only read again if its stat information changes,
+    and a changed mtime alone (touch, git checkout, restored CI cache) doesn't trigger
+    a rebuild.
+    """
+
+    version = 1
+
+    def __init__(self, site_root: str):
+        self._site_root = site_root
+        self.__path = os.path.join(site_root, STATE_FILE)
+        self.__files = dict()
+        self.__targets = dict()
+        self.__modified = False
+
+    def load(self) -> None:
+        try:
+            with open(self.__path, 'rt') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if state.get('version') != self.version:
+            return
+
+        self.__files = state['files']
+        self.__targets = state['targets']
+
+    def save(self) -> None:
+        if not self.__modified:
+            return
+
+        state = {
+            'version': self.version,
+            'files': self.__files,
+            'targets': self.__targets,
+        }
+        write_json(self.__path, state, sort_keys=True)
+        self.__modified = False
+
+    def digest(self, path: str) -> (str, None):
+        """
+        Returns the digest of a file relative to the site root, or None if it doesn't exist
+        """
+        try:
+            st = os.stat(os.path.join(self._site_root, path))
+        except FileNotFoundError:
+            if self.__files.pop(path, None) is not None:
+                self.__modified = True
+            return None
+
+        cached = self.__files.get(path)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        digest = file_digest(os.path.join(self._site_root, path))
+        self.__files[path] = [st.st_size, st.st_mtime_ns, digest]
+        self.__modified = True
+        return digest
+
+    def is_outdated(self, target: str, action, inputs) -> bool:
+        record = self.__targets.get(target)
+        if record is None or record['action'] != action_name(action):
+            return True
+
+        # an action may write no output, e.g. CompressAction for small files
+        if self.digest(target) != record['output']:
+            return True
+
+        return record['inputs'] != {path: self.digest(path) for path in inputs}
+
+    def record(self, target: str, action, inputs) -> None:
+        self.__targets[target] = {
+            'action': action_name(action),
+            'inputs': {path: self.digest(path) for path in inputs},
+            'output': self.digest(target),
+        }
+        self.__modified = True
+
+    def forget(self, target: str) -> None:
+        if self.__targets.pop(target, None) is not None:
+            self.__modified = True
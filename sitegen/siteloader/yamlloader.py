@@ -0,0 +1,35 @@
+from collections import OrderedDict
+import hashlib
+
+FRONT_MATTER_CACHE_SIZE = 10000
+
+_front_matter_cache = OrderedDict()
+
+
+def load_yaml(stream):
+    """
+    Parses YAML text or a file with the safe loader of libyaml, if available
+
+    PyYAML is imported at the first call, for the startup time of the commands.
+    """
+    import yaml
+
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def load_front_matter(yaml_text: str):
+    """
+    Parses the front matter of a page, caching the result by the digest of the text
+
+    The returned object is shared between the callers, it must not be modified.
+    """
+    key = hashlib.sha1(yaml_text.encode('utf-8')).digest()
+    if key in _front_matter_cache:
+        _front_matter_cache.move_to_end(key)
+        return _front_matter_cache[key]
+
+    front_matter = load_yaml(yaml_text)
+    _front_matter_cache[key] = front_matter
+    if len(_front_matter_cache) > FRONT_MATTER_CACHE_SIZE:
+        _front_matter_cache.popitem(last=False)
+    return front_matter
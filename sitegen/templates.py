@@ -1,24 +1,105 @@
-from collections.abc import Mapping
+from collections.abc import Mapping, Sequence
 import os
-import sys
 
-import jinja2
+from sitegen.profiling import profiler
+from sitegen.siteloader.output import write_file
 
 
 VARIABLE_START_STRING = '(('
 VARIABLE_END_STRING = '))'
 
 class TemplateRenderer:
-    def __init__(self, template_root):
-        loader = jinja2.FileSystemLoader(sys.path + [template_root])
+    """
+    Renders the templates found in the template root directory
+
+    @template_root can be a list of directories, which are searched in order.
+    Renderers are shared per template root (see get()), so the compiled
+    templates are cached by the Jinja environment for the whole process.
+    """
+
+    __renderers = dict()
+
+    def __init__(self, template_root: (str, Sequence), *, bytecode_cache_dir: (str, None)=None):
+        # Jinja is imported only when a renderer is created, for the startup time of the commands
+        import jinja2
+
+        loader = jinja2.FileSystemLoader(self.__get_roots(template_root))
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dir)
+        else:
+            bytecode_cache = None
+
         self.__environment = jinja2.Environment(variable_start_string=VARIABLE_START_STRING,
                                                 variable_end_string=VARIABLE_END_STRING,
-                                                loader=loader)
+                                                loader=loader,
+                                                bytecode_cache=bytecode_cache)
 
-    def render(self, template_file_path: str, template_variables: Mapping) -> str:
-        template = self.__environment.get_template(template_file_path)
+    @staticmethod
+    def __get_roots(template_root: (str, Sequence)) -> list:
+        return [template_root] if isinstance(template_root, str) else list(template_root)
 
-        return template.render(**template_variables)
+    @classmethod
+    def get(cls, template_root: (str, Sequence), *, bytecode_cache_dir: (str, None)=None):
+        key = (tuple(os.path.abspath(root) for root in cls.__get_roots(template_root)), bytecode_cache_dir)
+        if key not in cls.__renderers:
+            cls.__renderers[key] = cls(template_root, bytecode_cache_dir=bytecode_cache_dir)
+        return cls.__renderers[key]
+
+    def render(self, template_file_path: str, template_variables: Mapping) -> str:
+        with profiler.phase('render'):
+            template = self.__environment.get_template(template_file_path)
+            return template.render(**template_variables)
+
+    def get_template_files(self, template_file_path: str) -> list:
+        """
+        Returns the files of the template and of the templates it uses, recursively
+
+        The references ({% extends %}, {% include %}, {% import %}) are found in the
+        template AST; the ones with a name computed at render time and the missing
+        templates are skipped.
+        """
+        return [filename for filename, ast in self.__parse_templates(template_file_path)]
+
+    def get_call_arguments(self, template_file_path: str, function_name: str) -> list:
+        """
+        Returns the constant string first arguments of the calls of @function_name in the template
+        and in the templates it uses, e.g. ['css/style.css'] for (( asset('css/style.css') ))
+        """
+        import jinja2.nodes
+
+        arguments = list()
+        for filename, ast in self.__parse_templates(template_file_path):
+            for call in ast.find_all(jinja2.nodes.Call):
+                if isinstance(call.node, jinja2.nodes.Name) and call.node.name == function_name and call.args \
+                        and isinstance(call.args[0], jinja2.nodes.Const) and isinstance(call.args[0].value, str):
+                    arguments.append(call.args[0].value)
+        return arguments
+
+    def __parse_templates(self, template_file_path: str) -> list:
+        import jinja2
+        import jinja2.meta
+
+        templates = list()
+        visited = set()
+        pending = [template_file_path]
+        while pending:
+            name = pending.pop()
+            if name in visited:
+                continue
+            visited.add(name)
+
+            try:
+                source, filename, _ = self.__environment.loader.get_source(self.__environment, name)
+            except jinja2.TemplateNotFound:
+                continue
+
+            ast = self.__environment.parse(source)
+            templates.append((filename, ast))
+            references = jinja2.meta.find_referenced_templates(ast)
+            pending.extend(reference for reference in references if reference is not None)
+
+        return templates
 
 
 class File:
@@ -28,14 +109,16 @@ class File:
             template_variables: Mapping,
             path: str,
             *,
-            template_root: (str, None)=None
+            template_root: (str, Sequence, None)=None,
+            bytecode_cache_dir: (str, None)=None
     ):
         self.__new_contents = None
 
         self.__path = path
         self.__template_file_path = template_file_path
         self.__template_variables = dict(template_variables)
-        self.__template_renderer = TemplateRenderer(template_root or os.curdir)
+        self.__template_renderer = TemplateRenderer.get(template_root or os.curdir,
+                                                        bytecode_cache_dir=bytecode_cache_dir)
 
     @property
     def path(self):
@@ -58,6 +141,10 @@ class File:
     def get_rendered_content(self):
         return self.__render()
 
-    def update(self):
-        with open(self.path, 'wt') as f:
-            f.write(self.__render())
+    def update(self) -> bool:
+        """
+        Writes the rendered template into the file, unless it has the same contents; returns whether it was written
+        """
+        contents = self.__render()
+        with profiler.phase('write'):
+            return write_file(self.path, contents)
@@ -0,0 +1,167 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from sitegen.siteloader.base import LAYOUTS_DIRECTORY
+
+
+def is_watched_directory(path: str) -> bool:
+    """
+    Returns whether a directory (relative to the site root) may contain site sources
+
+    The generated directories and the ones with a leading '_' or '.' are not watched,
+    except the layouts.
+    """
+    if not path:
+        return True
+    parts = path.split(os.sep)
+    if parts[0].startswith('_') and parts[0] != LAYOUTS_DIRECTORY:
+        return False
+    return not any(part.startswith('.') for part in parts)
+
+
+class PollingWatcher:
+    """
+    Detects changes by comparing the size and mtime of the files periodically
+    """
+
+    def __init__(self, site_root: str, *, interval: float=1.0):
+        self._site_root = site_root
+        self.__interval = interval
+        self.__snapshot = self.__take_snapshot()
+
+    def wait(self) -> set:
+        """
+        Blocks until files are changed, returns the changed paths relative to the site root
+        """
+        while True:
+            time.sleep(self.__interval)
+            snapshot = self.__take_snapshot()
+            changed = {path for path in snapshot.keys() | self.__snapshot.keys()
+                       if snapshot.get(path) != self.__snapshot.get(path)}
+            self.__snapshot = snapshot
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+    def __take_snapshot(self) -> dict:
+        snapshot = dict()
+        for root, dirs, files in os.walk(self._site_root):
+            directory = os.path.relpath(root, self._site_root)
+            directory = '' if directory == os.curdir else directory
+            dirs[:] = [d for d in dirs if is_watched_directory(os.path.join(directory, d))]
+
+            for entry in files:
+                try:
+                    st = os.stat(os.path.join(root, entry))
+                except FileNotFoundError:
+                    continue
+                snapshot[os.path.join(directory, entry)] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+
+class InotifyWatcher:
+    """
+    Receives the changed paths from the kernel via inotify (Linux only)
+
+    Every watched directory has its own watch descriptor; the new directories
+    are added when they are created.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, site_root: str, *, latency: float=0.05):
+        self._site_root = site_root
+        self.__latency = latency
+        self.__libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.__fd = self.__libc.inotify_init1(self.IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1() failed')
+        self.__directories = dict()
+        self.__add_tree('')
+
+    @classmethod
+    def is_available(cls) -> bool:
+        libc_name = ctypes.util.find_library('c')
+        return bool(libc_name) and hasattr(ctypes.CDLL(libc_name), 'inotify_init1')
+
+    def wait(self) -> set:
+        """
+        Blocks until files are changed, returns the changed paths relative to the site root
+
+        The events arriving within the latency period after the first one are collected
+        into the same batch, so a multi-file save causes one rebuild.
+        """
+        changed = set()
+        timeout = None
+        while True:
+            readable, _, _ = select.select([self.__fd], [], [], timeout)
+            if not readable:
+                return changed
+            changed |= self.__read_events()
+            if changed:
+                timeout = self.__latency
+
+    def close(self):
+        os.close(self.__fd)
+
+    def __add_tree(self, directory: str) -> set:
+        files = set()
+        self.__add_watch(directory)
+        for root, dirs, entries in os.walk(os.path.join(self._site_root, directory)):
+            relative_root = os.path.relpath(root, self._site_root)
+            relative_root = '' if relative_root == os.curdir else relative_root
+            dirs[:] = [d for d in dirs if is_watched_directory(os.path.join(relative_root, d))]
+            for d in dirs:
+                self.__add_watch(os.path.join(relative_root, d))
+            files.update(os.path.join(relative_root, entry) for entry in entries)
+        return files
+
+    def __add_watch(self, directory: str):
+        path = os.path.join(self._site_root, directory)
+        wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(path), self.MASK)
+        if wd >= 0:
+            self.__directories[wd] = directory
+
+    def __read_events(self) -> set:
+        changed = set()
+        data = os.read(self.__fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if wd not in self.__directories or not name:
+                continue
+
+            path = os.path.join(self.__directories[wd], name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and is_watched_directory(path):
+                    changed |= self.__add_tree(path)
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    changed.add(path)
+            elif not mask & self.IN_CREATE:
+                changed.add(path)
+        return changed
+
+
+def create_watcher(site_root: str, *, polling: bool=False):
+    if not polling and InotifyWatcher.is_available():
+        return InotifyWatcher(site_root)
+    return PollingWatcher(site_root)